@@ -21,13 +21,13 @@
 {
     "name": "Finnish Banks",
     "summary": "Finnish banks and their addresses",
-    "version": "13.0.1.0.0",
+    "version": "13.0.1.1.0",
     "category": "Localization",
     "website": "https://odoo-community.org/",
     "author": "Oy Tawasta Technologies Ltd., Odoo Community Association (OCA)",
     "license": "AGPL-3",
     "application": False,
     "installable": True,
-    "depends": ["base"],
+    "depends": ["base", "l10n_fi_instrumentation"],
     "data": ["data/res_bank.xml"],
 }
@@ -0,0 +1,5 @@
+# Copyright 2020 Oy Tawasta OS Technologies Ltd.
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+from . import res_bank
+from . import res_partner_bank
@@ -0,0 +1,187 @@
+# Copyright 2020 Oy Tawasta OS Technologies Ltd.
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+import csv
+import hashlib
+import io
+import logging
+import os
+import time
+
+from psycopg2.extras import execute_values
+
+from odoo import api, models
+from odoo.tools import split_every
+
+_logger = logging.getLogger(__name__)
+
+# Finnish banks, one row per BIC, with the national bank codes of the bank
+# separated by spaces in the `codes` column
+BANK_DATA_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'data', 'banks.csv',
+)
+
+# res.bank columns loaded from the data file, besides the BIC, in the order
+# of the column lists of the queries of ResBank._upsert_banks
+BANK_COLUMNS = ('name', 'street', 'street2', 'zip', 'city', 'phone', 'email')
+
+# Checksum of the last loaded data file, an unchanged file is not reloaded
+CHECKSUM_PARAMETER = 'l10n_fi_banks.bank_data_checksum'
+
+
+def read_bank_data(path=BANK_DATA_FILE):
+    """ Rows of a bank data file as dictionaries """
+    with open(path, encoding='utf-8', newline='') as data_file:
+        return list(csv.DictReader(data_file))
+
+
+class ResBank(models.Model):
+    _inherit = 'res.bank'
+
+    @api.model
+    def _load_finnish_banks(self, path=BANK_DATA_FILE, batch_size=1000):
+        """
+        Create or update the banks of a bank data file by BIC. Called on
+        every install and upgrade of the module.
+
+        Every batch of rows is compared with the existing banks in one
+        query, and only new and changed banks are written, with one
+        statement each. The banks get an external id `res_bank_<BIC>`.
+        Loading is skipped when the file has not changed since the last
+        load and all of its banks still exist, e.g. have not been removed
+        by uninstalling the module.
+
+        :return: dictionary of load statistics
+        """
+        with open(path, 'rb') as data_file:
+            content = data_file.read()
+        checksum = hashlib.sha1(content).hexdigest()
+        rows = list(csv.DictReader(io.StringIO(content.decode('utf-8-sig'))))
+        parameters = self.env['ir.config_parameter'].sudo()
+        stats = dict.fromkeys(('rows', 'created', 'updated', 'unchanged'), 0)
+        self.flush()
+        if parameters.get_param(CHECKSUM_PARAMETER) == checksum \
+                and self._finnish_banks_exist(rows):
+            _logger.info('Finnish bank data unchanged, not reloaded')
+            return stats
+
+        start = time.perf_counter()
+        country_id = self.env.ref('base.fi').id
+        for chunk in split_every(batch_size, rows, list):
+            self._upsert_banks(chunk, country_id, stats)
+        self.invalidate_cache()
+        self.env['ir.model.data'].clear_caches()
+        parameters.set_param(CHECKSUM_PARAMETER, checksum)
+
+        stats['seconds'] = time.perf_counter() - start
+        _logger.info(
+            'Loaded %(rows)d Finnish banks in %(seconds).2fs: %(created)d '
+            'created, %(updated)d updated, %(unchanged)d unchanged', stats)
+        return stats
+
+    @api.model
+    def _finnish_banks_exist(self, rows):
+        """ Whether the banks of the rows all exist with their external
+        ids """
+        names = {
+            'res_bank_' + (row.get('bic') or '').strip().upper()
+            for row in rows if (row.get('bic') or '').strip()
+        }
+        self.env.cr.execute("""
+            SELECT count(*)
+            FROM ir_model_data AS d
+            JOIN res_bank AS b ON b.id = d.res_id
+            WHERE d.module = 'l10n_fi_banks'
+              AND d.model = 'res.bank'
+              AND d.name = ANY(%s)
+        """, (list(names),))
+        return self.env.cr.fetchone()[0] == len(names)
+
+    @api.model
+    def _upsert_banks(self, rows, country_id, stats):
+        values = {}
+        for row in rows:
+            bic = (row.get('bic') or '').strip().upper()
+            if bic:
+                values[bic] = tuple(
+                    (row.get(column) or '').strip() or None
+                    for column in BANK_COLUMNS
+                )
+        stats['rows'] += len(values)
+        if not values:
+            return
+
+        cr = self.env.cr
+        # Existing BICs are matched case-insensitively, like they are read
+        cr.execute("""
+            SELECT id, upper(bic),
+                   name, street, street2, zip, city, phone, email,
+                   country
+            FROM res_bank
+            WHERE upper(bic) = ANY(%s)
+        """, (list(values),))
+        found = set()
+        updates = []
+        for row in cr.fetchall():
+            bank_id, bic, current, country = \
+                row[0], row[1], row[2:-1], row[-1]
+            found.add(bic)
+            if current == values[bic] and country == country_id:
+                stats['unchanged'] += 1
+            else:
+                updates.append((bank_id,) + values[bic])
+
+        if updates:
+            execute_values(cr, """
+                UPDATE res_bank AS b
+                SET name = v.name, street = v.street, street2 = v.street2,
+                    zip = v.zip, city = v.city, phone = v.phone,
+                    email = v.email,
+                    country = v.country,
+                    write_uid = v.uid,
+                    write_date = (now() at time zone 'UTC')
+                FROM (VALUES %s) AS v(id, name, street, street2, zip, city,
+                                      phone, email, country, uid)
+                WHERE b.id = v.id
+            """, [
+                vals + (country_id, self.env.uid) for vals in updates
+            ], page_size=len(updates))
+            stats['updated'] += len(updates)
+
+        inserts = [
+            (bic,) + vals for bic, vals in values.items() if bic not in found
+        ]
+        if inserts:
+            execute_values(cr, """
+                INSERT INTO res_bank (bic, name, street, street2, zip, city,
+                                      phone, email, country, active,
+                                      create_uid, create_date,
+                                      write_uid, write_date)
+                VALUES %s
+            """, [
+                vals + (country_id, self.env.uid, self.env.uid)
+                for vals in inserts
+            ], template="""(
+                %s, %s, %s, %s, %s, %s, %s, %s, %s, TRUE,
+                %s, (now() at time zone 'UTC'),
+                %s, (now() at time zone 'UTC')
+            )""", page_size=len(inserts))
+            stats['created'] += len(inserts)
+
+        # External ids for referring to the banks, e.g. from other data
+        # files. They are marked noupdate, since they are not loaded from
+        # an XML data file and would be removed at the end of an upgrade
+        # otherwise.
+        cr.execute("""
+            INSERT INTO ir_model_data (module, name, model, res_id, noupdate)
+            SELECT 'l10n_fi_banks', 'res_bank_' || upper(bic), 'res.bank',
+                   min(id), TRUE
+            FROM res_bank
+            WHERE upper(bic) = ANY(%s)
+            GROUP BY upper(bic)
+            ON CONFLICT (module, name) DO UPDATE
+            SET noupdate = TRUE, res_id = EXCLUDED.res_id
+            WHERE ir_model_data.noupdate IS NOT TRUE
+               OR ir_model_data.res_id != EXCLUDED.res_id
+        """, (list(values),))
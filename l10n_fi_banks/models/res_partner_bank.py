@@ -0,0 +1,143 @@
+# Copyright 2020 Oy Tawasta OS Technologies Ltd.
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+import logging
+import re
+
+from odoo import api, models
+
+from .res_bank import read_bank_data
+
+_logger = logging.getLogger(__name__)
+
+# Finnish national bank codes, i.e. the leading digits of the account part of
+# a Finnish IBAN, and the BICs of the banks as listed in data/banks.csv.
+# Longer codes take precedence over the shorter codes they start with.
+FINNISH_BANK_CODES = {
+    code: row['bic']
+    for row in read_bank_data()
+    for code in row['codes'].split()
+}
+
+
+def _build_prefix_table(bank_codes):
+    """ Expand the bank codes to a table of every three digit prefix, so that
+    resolving a bank is a single dictionary lookup """
+    table = {}
+    # Shorter codes first, so that longer codes overwrite them
+    for code, bic in sorted(bank_codes.items(), key=lambda item: len(item[0])):
+        width = 3 - len(code)
+        for suffix in range(10 ** width):
+            table[code + str(suffix).zfill(width) if width else code] = bic
+    return table
+
+
+FINNISH_BANK_PREFIXES = _build_prefix_table(FINNISH_BANK_CODES)
+
+# Letters of an IBAN as the numbers they stand for in the checksum
+_IBAN_LETTERS = {ord(c): str(ord(c) - 55) for c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'}
+
+_IBAN_RE = re.compile(r'[A-Z]{2}[0-9]{2}[A-Z0-9]{1,30}\Z')
+_FINNISH_IBAN_RE = re.compile(r'FI[0-9]{16}\Z')
+
+
+def normalize_iban(iban):
+    """ Upper case an IBAN and drop its whitespace, e.g. as printed on
+    invoices in groups of four characters """
+    if not iban:
+        return ''
+    return ''.join(iban.split()).upper()
+
+
+def validate_iban(iban):
+    """ Check the mod 97 checksum of a normalized IBAN of any country. Finnish
+    IBANs must also have the Finnish length of 18 characters. """
+    if iban[:2] == 'FI':
+        if not _FINNISH_IBAN_RE.match(iban):
+            return False
+        # Skip the translation, F and I are 15 and 18
+        return int(iban[4:] + '1518' + iban[2:4]) % 97 == 1
+    if not _IBAN_RE.match(iban):
+        return False
+    return int((iban[4:] + iban[:4]).translate(_IBAN_LETTERS)) % 97 == 1
+
+
+def get_finnish_bank_bic(iban):
+    """ BIC of the bank of a normalized Finnish IBAN, or None if the IBAN is
+    not a valid Finnish IBAN or the bank is not known """
+    if not validate_iban(iban) or iban[:2] != 'FI':
+        return None
+    return FINNISH_BANK_PREFIXES.get(iban[4:7])
+
+
+def get_finnish_bank_bics(ibans):
+    """ Resolve many IBANs at once, e.g. the rows of an import file.
+
+    :param ibans: iterable of IBANs, normalized or not
+    :return: list of the BIC of each IBAN, None where it cannot be resolved
+    """
+    prefixes = FINNISH_BANK_PREFIXES
+    bics = []
+    for iban in ibans:
+        iban = normalize_iban(iban)
+        bics.append(
+            prefixes.get(iban[4:7])
+            if iban[:2] == 'FI' and validate_iban(iban) else None
+        )
+    return bics
+
+
+class ResPartnerBank(models.Model):
+    _inherit = 'res.partner.bank'
+
+    @api.model
+    def _get_bank_ids_by_bic(self, bics):
+        """ {BIC: res.bank id} of the banks with the given BICs """
+        banks = self.env['res.bank'].search_read(
+            [('bic', 'in', list(set(bics)))], ['bic'])
+        return {bank['bic']: bank['id'] for bank in banks}
+
+    @api.model
+    def _import_bank_accounts(self, vals_list):
+        """ Create bank accounts in bulk from IBANs.
+
+        The IBAN of each row (`acc_number`) is normalized and validated and
+        the bank of Finnish IBANs is resolved from the national bank code,
+        unless the row has a `bank_id`. Rows with an invalid IBAN and rows
+        of accounts that already exist in the same company are not created,
+        like the uniqueness rule of the accounts requires.
+
+        :param vals_list: list of res.partner.bank values
+        :return: (created bank accounts, list of (values, reason) of the
+            rows that were not created)
+        """
+        ibans = [normalize_iban(vals.get('acc_number')) for vals in vals_list]
+        bics = get_finnish_bank_bics(ibans)
+        bank_ids = self._get_bank_ids_by_bic([bic for bic in bics if bic])
+
+        self.flush(['sanitized_acc_number', 'company_id'])
+        self.env.cr.execute(
+            "SELECT sanitized_acc_number, company_id FROM res_partner_bank "
+            "WHERE sanitized_acc_number = ANY(%s)", (ibans,))
+        existing = set(self.env.cr.fetchall())
+
+        default_company_id = self.default_get(['company_id']).get('company_id')
+        to_create = []
+        rejected = []
+        for vals, iban, bic in zip(vals_list, ibans, bics):
+            key = (iban, vals.get('company_id', default_company_id) or None)
+            if not validate_iban(iban):
+                rejected.append((vals, 'invalid'))
+            elif key in existing:
+                rejected.append((vals, 'exists'))
+            else:
+                existing.add(key)
+                vals = dict(vals, acc_number=iban)
+                if not vals.get('bank_id') and bic in bank_ids:
+                    vals['bank_id'] = bank_ids[bic]
+                to_create.append(vals)
+
+        created = self.create(to_create)
+        _logger.info('Imported %d bank accounts, rejected %d',
+                     len(created), len(rejected))
+        return created, rejected
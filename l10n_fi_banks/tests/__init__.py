@@ -0,0 +1,2 @@
+from . import test_iban
+from . import test_bank_loader
@@ -0,0 +1,91 @@
+import csv
+import logging
+import os
+import tempfile
+
+from odoo.tests import SavepointCase, tagged
+from odoo.addons.l10n_fi_instrumentation import instrumentation
+
+from ..models.res_bank import BANK_COLUMNS, read_bank_data
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install')
+class BankLoaderTest(SavepointCase):
+
+    # Synthetic banks in the data file whose load time is logged
+    rows = instrumentation.sample_size('BANK_ROWS', 2000)
+
+    def _write_data_file(self, rows):
+        data_file = tempfile.NamedTemporaryFile(
+            'w', suffix='.csv', encoding='utf-8', newline='', delete=False)
+        self.addCleanup(os.unlink, data_file.name)
+        with data_file:
+            writer = csv.DictWriter(
+                data_file, ('bic',) + BANK_COLUMNS + ('codes',))
+            writer.writeheader()
+            writer.writerows(rows)
+        return data_file.name
+
+    def _synthetic_rows(self):
+        return [{
+            'bic': 'TEST%04dXX' % idx,
+            'name': 'Test Bank %d' % idx,
+            'street': 'Testikatu %d' % idx,
+            'zip': '00100',
+            'city': 'HELSINKI',
+            'codes': '',
+        } for idx in range(self.rows)]
+
+    def test_shipped_banks(self):
+        for row in read_bank_data():
+            bank = self.env.ref('l10n_fi_banks.res_bank_%s' % row['bic'])
+            self.assertEqual(row['name'], bank.name)
+            self.assertEqual(self.env.ref('base.fi'), bank.country)
+
+    def test_load(self):
+        bank_model = self.env['res.bank']
+        rows = self._synthetic_rows()
+
+        stats = bank_model._load_finnish_banks(self._write_data_file(rows))
+        _logger.info('Loaded %d banks in %.3fs', self.rows, stats['seconds'])
+        self.assertEqual(self.rows, stats['created'])
+        bank = self.env.ref('l10n_fi_banks.res_bank_TEST0001XX')
+        self.assertEqual('Test Bank 1', bank.name)
+
+        # An unchanged file is not loaded at all
+        path = self._write_data_file(rows)
+        self.assertEqual(0, bank_model._load_finnish_banks(path)['rows'])
+
+        rows[1]['name'] = 'Renamed Test Bank'
+        stats = bank_model._load_finnish_banks(
+            self._write_data_file(rows), batch_size=300)
+        self.assertEqual(0, stats['created'])
+        self.assertEqual(1, stats['updated'])
+        self.assertEqual(self.rows - 1, stats['unchanged'])
+        self.assertEqual('Renamed Test Bank', bank.name)
+
+    def test_reload_removed_banks(self):
+        # E.g. uninstalling the module removes the banks but not the checksum
+        bank_model = self.env['res.bank']
+        path = self._write_data_file(self._synthetic_rows()[:3])
+        bank_model._load_finnish_banks(path)
+        self.env.ref('l10n_fi_banks.res_bank_TEST0001XX').unlink()
+
+        stats = bank_model._load_finnish_banks(path)
+        self.assertEqual(1, stats['created'])
+        self.assertEqual(2, stats['unchanged'])
+        self.assertTrue(self.env.ref('l10n_fi_banks.res_bank_TEST0001XX'))
+
+    def test_lowercase_bic(self):
+        bank = self.env['res.bank'].create({
+            'name': 'Lowercase Bank',
+            'bic': 'test0000xx',
+        })
+        stats = self.env['res.bank']._load_finnish_banks(
+            self._write_data_file(self._synthetic_rows()[:2]))
+        self.assertEqual(1, stats['created'])
+        self.assertEqual(1, stats['updated'])
+        self.assertEqual(bank, self.env.ref('l10n_fi_banks.res_bank_TEST0000XX'))
+        self.assertEqual('Test Bank 0', bank.name)
@@ -0,0 +1,111 @@
+import logging
+import random
+import time
+import unittest
+
+from odoo.tests import SavepointCase, tagged
+from odoo.addons.l10n_fi_instrumentation import instrumentation
+
+from ..models.res_partner_bank import (
+    FINNISH_BANK_CODES,
+    get_finnish_bank_bic,
+    get_finnish_bank_bics,
+    normalize_iban,
+    validate_iban,
+)
+
+_logger = logging.getLogger(__name__)
+
+
+def make_finnish_iban(bban):
+    """ Finnish IBAN of a 14 digit account number """
+    check = 98 - int(bban + '151800') % 97
+    return 'FI%02d%s' % (check, bban)
+
+
+@tagged('standard', 'at_install')
+class IbanTest(unittest.TestCase):
+
+    # Synthetic IBANs resolved in the throughput test
+    samples = instrumentation.sample_size('IBAN_SAMPLES', 5000)
+
+    def test_validate_iban(self):
+        for iban in ('FI2112345600000785', 'FI5542345670000081',
+                     'DE89370400440532013000', 'GB82WEST12345698765432'):
+            self.assertTrue(validate_iban(iban), iban)
+        for iban in ('', 'FI2112345600000786', 'FI211234560000078',
+                     'FI21123456000007850', 'FI21 1234 5600 0007 85',
+                     'DE89370400440532013001', 'fi2112345600000785'):
+            self.assertFalse(validate_iban(iban), iban)
+        self.assertEqual('FI2112345600000785',
+                         normalize_iban(' fi21 1234 5600 0007 85 '))
+
+    def test_finnish_bank_bic(self):
+        self.assertEqual('NDEAFIHH', get_finnish_bank_bic('FI2112345600000785'))
+        self.assertEqual('ITELFIHH', get_finnish_bank_bic('FI5542345670000081'))
+        for code, bic in FINNISH_BANK_CODES.items():
+            iban = make_finnish_iban(code.ljust(14, '0'))
+            self.assertEqual(bic, get_finnish_bank_bic(iban), code)
+        self.assertEqual('HELSFIHH',
+                         get_finnish_bank_bic(make_finnish_iban('40500000000000')))
+        self.assertEqual('ITELFIHH',
+                         get_finnish_bank_bic(make_finnish_iban('40600000000000')))
+        self.assertIsNone(get_finnish_bank_bic('FI2112345600000786'))
+        self.assertIsNone(get_finnish_bank_bic('DE89370400440532013000'))
+        self.assertIsNone(get_finnish_bank_bic(make_finnish_iban('00000000000000')))
+
+    def test_finnish_bank_bics_throughput(self):
+        rand = random.Random(20200101)
+        ibans = [make_finnish_iban('%014d' % rand.randrange(10 ** 14))
+                 for dummy in range(self.samples)]
+
+        start = time.perf_counter()
+        bics = get_finnish_bank_bics(ibans)
+        seconds = time.perf_counter() - start
+        _logger.info('Resolved %d IBANs in %.3fs, %.0f IBANs/s', len(ibans),
+                     seconds, len(ibans) / (seconds or 1e-9))
+
+        self.assertEqual([get_finnish_bank_bic(iban) for iban in ibans[:1000]],
+                         bics[:1000])
+
+
+@tagged('post_install', '-at_install')
+class ImportBankAccountTest(SavepointCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.partner = cls.env['res.partner'].create({'name': 'Test Oy'})
+        cls.env['res.partner.bank'].create({
+            'acc_number': 'FI5542345670000081',
+            'partner_id': cls.partner.id,
+        })
+
+    def test_import_bank_accounts(self):
+        created, rejected = self.env['res.partner.bank']._import_bank_accounts([
+            {'acc_number': 'fi21 1234 5600 0007 85',
+             'partner_id': self.partner.id},
+            {'acc_number': 'FI2112345600000786',
+             'partner_id': self.partner.id},
+            {'acc_number': 'FI55 4234 5670 0000 81',
+             'partner_id': self.partner.id},
+            {'acc_number': 'DE89370400440532013000',
+             'partner_id': self.partner.id},
+        ])
+        self.assertEqual(['FI2112345600000785', 'DE89370400440532013000'],
+                         created.mapped('acc_number'))
+        self.assertEqual(self.env.ref('l10n_fi_banks.res_bank_NDEAFIHH'),
+                         created[0].bank_id)
+        self.assertFalse(created[1].bank_id)
+        self.assertEqual(['invalid', 'exists'],
+                         [reason for vals, reason in rejected])
+
+    def test_import_bank_accounts_other_company(self):
+        company = self.env['res.company'].create({'name': 'Other Company'})
+        created, rejected = self.env['res.partner.bank']._import_bank_accounts([
+            {'acc_number': 'FI5542345670000081',
+             'partner_id': self.partner.id,
+             'company_id': company.id},
+        ])
+        self.assertEqual(company, created.company_id)
+        self.assertFalse(rejected)
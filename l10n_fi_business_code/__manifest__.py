@@ -19,7 +19,7 @@
 {
     "name": "Partner business code (business id)",
     "summary": "Adds a business code (business id) for partners",
-    "version": "13.0.1.0.0",
+    "version": "13.0.1.1.0",
     "category": "CRM",
     "website": "https://odoo-community.org/",
     "author": "Oy Tawasta Technologies Ltd., Odoo Community Association (OCA)",
@@ -37,6 +37,7 @@
         'data/res_partner_id_category.xml',
         'views/res_partner.xml',
     ],
+    "pre_init_hook": "pre_init_hook",
     "demo": [
     ],
     "qweb": [
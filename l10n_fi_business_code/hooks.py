@@ -0,0 +1,54 @@
+# Copyright 2020 Avoin.Systems
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+import logging
+
+from psycopg2.extras import execute_values
+
+from odoo import SUPERUSER_ID, api, tools
+
+from .models.res_partner import normalize_business_id
+
+_logger = logging.getLogger(__name__)
+
+
+def fill_business_id_normalized(cr):
+    """ Create and fill the `business_id_normalized` column of partners.
+
+    Odoo computes a new stored field through the ORM for every partner when
+    it creates its column, although only the partners with a business ID
+    number get a value. Creating the column beforehand skips that, and only
+    those partners are written here, with one statement.
+
+    :return: number of partners with a normalized business ID
+    """
+    if not tools.column_exists(cr, 'res_partner', 'business_id_normalized'):
+        tools.create_column(
+            cr, 'res_partner', 'business_id_normalized', 'varchar')
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    categories = env['res.partner.id_category'].search([
+        ('code', '=', 'business_id'),
+    ])
+    if not categories:
+        return 0
+    values = {}
+    # The first number of a partner in the order of its id_numbers wins,
+    # like in the compute method
+    for vals in env['res.partner.id_number'].search_read(
+            [('category_id', 'in', categories.ids)], ['partner_id', 'name']):
+        if vals['partner_id']:
+            values.setdefault(vals['partner_id'][0],
+                              normalize_business_id(vals['name']) or None)
+    if values:
+        execute_values(cr, """
+            UPDATE res_partner AS p
+            SET business_id_normalized = v.business_id
+            FROM (VALUES %s) AS v(id, business_id)
+            WHERE p.id = v.id
+        """, list(values.items()), page_size=1000)
+    _logger.info('Normalized the business IDs of %d partners', len(values))
+    return len(values)
+
+
+def pre_init_hook(cr):
+    fill_business_id_normalized(cr)
@@ -0,0 +1,5 @@
+from odoo.addons.l10n_fi_business_code.hooks import fill_business_id_normalized
+
+
+def migrate(cr, version):
+    fill_business_id_normalized(cr)
@@ -1,8 +1,86 @@
 # Copyright 2017 Oy Tawasta OS Technologies Ltd.
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 
+from collections import defaultdict
+
 from odoo import models, fields, api
 
+# Weights of the seven digits of a business ID for the modulo 11 check
+BUSINESS_ID_WEIGHTS = (7, 9, 10, 5, 8, 4, 2)
+
+
+def normalize_business_id(value):
+    """ Normalize a Finnish business ID to the form 1234567-8.
+
+    Whitespace, a leading FI country code and the dash are optional in the
+    input, e.g. ``1234567-8``, ``12345678`` and ``FI12345678`` all give
+    ``1234567-8``. Old six digit IDs are padded with a leading zero.
+    Values that do not look like business IDs are returned upper cased and
+    without whitespace.
+    """
+    if not value:
+        return False
+    value = ''.join(value.split()).upper()
+    number = value[2:] if value.startswith('FI') else value
+    if '-' in number:
+        head, dummy, tail = number.partition('-')
+        if head.isdigit() and tail.isdigit() and len(head) in (6, 7) \
+                and len(tail) == 1:
+            return head.zfill(7) + '-' + tail
+    elif number.isdigit() and len(number) == 8:
+        return number[:7] + '-' + number[7:]
+    return value
+
+
+def get_business_id_check_digit(number):
+    """ Check digit of a seven digit business ID number, or False if the
+    number has no valid check digit. """
+    remainder = sum(
+        weight * int(digit)
+        for weight, digit in zip(BUSINESS_ID_WEIGHTS, number)
+    ) % 11
+    if remainder == 1:
+        return False
+    return str(11 - remainder if remainder else 0)
+
+
+def validate_business_id(value):
+    """ Check whether a value is a valid Finnish business ID. Any input
+    accepted by `normalize_business_id` is allowed. """
+    normalized = normalize_business_id(value)
+    if not normalized or len(normalized) != 9 or normalized[7] != '-' \
+            or not normalized[:7].isdigit() or not normalized[8].isdigit():
+        return False
+    return get_business_id_check_digit(normalized[:7]) == normalized[8]
+
+
+def business_id_to_vat(value):
+    """ Convert a business ID to the FI VAT number form, e.g. 1234567-8
+    to FI12345678. Returns False for invalid business IDs. """
+    if not validate_business_id(value):
+        return False
+    return 'FI' + normalize_business_id(value).replace('-', '')
+
+
+def vat_to_business_id(value):
+    """ Convert an FI VAT number to the business ID form, e.g. FI12345678
+    to 1234567-8. Returns False for invalid VAT numbers. """
+    normalized = normalize_business_id(value)
+    if not validate_business_id(normalized):
+        return False
+    return normalized
+
+
+def validate_business_ids(values):
+    """ Validate many business IDs, e.g. the rows of an import file.
+
+    :param values: iterable of business IDs
+    :return: generator of (value, normalized value, is valid) tuples
+    """
+    for value in values:
+        normalized = normalize_business_id(value)
+        yield value, normalized, validate_business_id(normalized)
+
 
 class ResPartner(models.Model):
     _inherit = 'res.partner'
@@ -15,9 +93,16 @@ class ResPartner(models.Model):
         inverse=lambda s: s._inverse_identification(
             'business_id', 'business_id',
         ),
-        search=lambda s, *a: s._search_identification(
-            'business_id', *a
-        ),
+        search=lambda s, *a: s._search_business_id(*a),
+    )
+    business_id_normalized = fields.Char(
+        string='Normalized Business ID',
+        compute='_compute_business_id_normalized',
+        store=True,
+        index=True,
+        copy=False,
+        help='Business ID in the form 1234567-8, used for fast exact '
+             'searches',
     )
 
     # copy of _compute_identification method with a fix for nonstored fields
@@ -51,12 +136,74 @@ class ResPartner(models.Model):
             field_name (str): Name of field to set.
             category_code (str): Category code of the Identification type.
         """
+        # Resolve the category once instead of reading it for every number
+        categories = self.env['res.partner.id_category'].search([
+            ('code', '=', category_code),
+        ])
         for record in self:
             id_numbers = record.id_numbers.filtered(
-                lambda r: r.category_id.code == category_code
+                lambda r: r.category_id in categories
             )
             if not id_numbers:
                 record[field_name] = False
                 continue
             value = id_numbers[0].name
             record[field_name] = value
+
+    @api.depends('id_numbers.name', 'id_numbers.category_id')
+    def _compute_business_id_normalized(self):
+        categories = self.env['res.partner.id_category'].search([
+            ('code', '=', 'business_id'),
+        ])
+        for record in self:
+            id_numbers = record.id_numbers.filtered(
+                lambda r: r.category_id in categories
+            )
+            record.business_id_normalized = \
+                normalize_business_id(id_numbers[:1].name)
+
+    @api.model
+    def _search_business_id(self, operator, value):
+        """ Search exact business IDs through the indexed normalized value,
+        other searches through the identification numbers. """
+        if operator == '=' and value:
+            return [('business_id_normalized', '=',
+                     normalize_business_id(value))]
+        return self._search_identification('business_id', operator, value)
+
+    def _validate_business_ids(self):
+        """ Validate the business IDs of the partners in the recordset.
+
+        :return: dictionary {partner id: (normalized business ID, is valid)}
+            of the partners that have a business ID
+        """
+        result = {}
+        for vals in self.read(['business_id_normalized']):
+            normalized = vals['business_id_normalized']
+            if normalized:
+                result[vals['id']] = (normalized, validate_business_id(normalized))
+        return result
+
+    @api.model
+    def _find_business_id_duplicates(self, domain=None):
+        """ Group partners sharing the same normalized business ID.
+
+        Only commercial entities are considered, contacts share the business
+        ID of their parent.
+
+        :param domain: optional domain restricting the partners
+        :return: dictionary {normalized business ID: partners} containing
+            only the business IDs with more than one partner
+        """
+        domain = (domain or []) + [
+            ('business_id_normalized', '!=', False),
+            ('is_company', '=', True),
+        ]
+        groups = defaultdict(list)
+        for vals in self.search_read(domain, ['business_id_normalized']):
+            groups[vals['business_id_normalized']].append(vals['id'])
+        return {
+            business_id: self.browse(partner_ids)
+            for business_id, partner_ids in groups.items()
+            if len(partner_ids) > 1
+        }
@@ -0,0 +1,4 @@
+# Copyright 2020 Avoin.Systems
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+from . import test_business_id
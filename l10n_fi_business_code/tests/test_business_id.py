@@ -0,0 +1,118 @@
+# Copyright 2020 Avoin.Systems
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+from odoo.tests import SavepointCase, tagged
+
+from ..hooks import fill_business_id_normalized
+from ..models.res_partner import (
+    business_id_to_vat,
+    normalize_business_id,
+    validate_business_id,
+    validate_business_ids,
+    vat_to_business_id,
+)
+
+
+@tagged('post_install', '-at_install')
+class TestBusinessId(SavepointCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.partner = cls.env['res.partner'].create({
+            'name': 'Test Company Oy',
+            'is_company': True,
+            'business_id': '0123456-2',
+        })
+
+    def test_normalize_business_id(self):
+        for value in ('0123456-2', '01234562', 'FI01234562', ' fi 0123456-2',
+                      '123456-2'):
+            self.assertEqual('0123456-2', normalize_business_id(value))
+        self.assertEqual('ABC', normalize_business_id(' abc '))
+        self.assertFalse(normalize_business_id(False))
+
+    def test_business_id_normalized_stored(self):
+        self.assertEqual('0123456-2', self.partner.business_id_normalized)
+        self.partner.business_id = 'FI76543212'
+        self.assertEqual('7654321-2', self.partner.business_id_normalized)
+
+    def test_fill_business_id_normalized(self):
+        partner_model = self.env['res.partner']
+        partner_model.create({
+            'name': 'Other Company Oy',
+            'is_company': True,
+            'business_id': 'fi 76543212',
+        })
+        partner_model.flush()
+        self.env.cr.execute("""
+            SELECT id, business_id_normalized
+            FROM res_partner
+            ORDER BY id
+        """)
+        expected = self.env.cr.fetchall()
+        self.env.cr.execute(
+            "UPDATE res_partner SET business_id_normalized = NULL")
+
+        fill_business_id_normalized(self.env.cr)
+        self.env.cr.execute("""
+            SELECT id, business_id_normalized
+            FROM res_partner
+            ORDER BY id
+        """)
+        self.assertEqual(expected, self.env.cr.fetchall())
+        partner_model.invalidate_cache()
+
+    def test_search_business_id(self):
+        partner_model = self.env['res.partner']
+        for value in ('0123456-2', 'FI01234562'):
+            self.assertEqual(
+                self.partner,
+                partner_model.search([('business_id', '=', value)]),
+            )
+        self.assertEqual(
+            self.partner,
+            partner_model.search([('business_id', 'like', '0123456')]),
+        )
+
+    def test_validate_business_id(self):
+        for value in ('0123456-2', 'FI01234562', '7654321-2', '0737546-2'):
+            self.assertTrue(validate_business_id(value), value)
+        for value in ('0123456-3', '1234567', 'ABC', '', False, '0000001-0'):
+            self.assertFalse(validate_business_id(value), value)
+
+    def test_business_id_to_vat(self):
+        self.assertEqual('FI01234562', business_id_to_vat('0123456-2'))
+        self.assertFalse(business_id_to_vat('0123456-3'))
+
+    def test_vat_to_business_id(self):
+        self.assertEqual('0123456-2', vat_to_business_id('FI01234562'))
+        self.assertEqual('0123456-2', vat_to_business_id('fi 0123 4562'))
+        self.assertFalse(vat_to_business_id('FI01234563'))
+        self.assertFalse(vat_to_business_id('SE556036079301'))
+        self.assertFalse(vat_to_business_id(False))
+
+    def test_validate_business_ids_batch(self):
+        self.assertEqual(
+            [('FI01234562', '0123456-2', True), ('x', 'X', False)],
+            list(validate_business_ids(['FI01234562', 'x'])),
+        )
+        partner = self.env['res.partner'].create({
+            'name': 'Invalid Oy',
+            'is_company': True,
+            'business_id': '1234567-0',
+        })
+        self.assertEqual(
+            {self.partner.id: ('0123456-2', True),
+             partner.id: ('1234567-0', False)},
+            (self.partner | partner)._validate_business_ids(),
+        )
+
+    def test_find_business_id_duplicates(self):
+        duplicate = self.env['res.partner'].create({
+            'name': 'Test Company Oy (duplicate)',
+            'is_company': True,
+            'business_id': 'FI01234562',
+        })
+        duplicates = self.env['res.partner']._find_business_id_duplicates()
+        self.assertEqual(self.partner | duplicate, duplicates['0123456-2'])
@@ -31,7 +31,7 @@
     "application": False,
     "installable": True,
     "external_dependencies": {"python": [], "bin": []},
-    "depends": ["account"],
+    "depends": ["account", "l10n_fi_business_code", "l10n_fi_instrumentation"],
     "data": [
         "data/res_partner_operator_einvoice.xml",
         "security/ir.model.access.csv",
@@ -1,23 +1,58 @@
-from odoo import api, SUPERUSER_ID
 import logging
 
+from odoo.addons.l10n_fi_edicode.models.res_partner import sync_edicode_to_children
+
 _logger = logging.getLogger(__name__)
 
+BATCH_SIZE = 5000
+
 
-def migrate(cr, version):
+def migrate(cr, version, batch_size=BATCH_SIZE):
     _logger.info('Synchronizing res.partner edicode fields '
                  'from parents to children')
 
-    env = api.Environment(cr, SUPERUSER_ID, {})
-
-    partners = env['res.partner'].search(
-        ['|',
-           ('edicode', '!=', False),
-           ('einvoice_operator_id', '!=', False),
-         ('is_company', '=', True)]
+    cr.execute(
+        """
+            SELECT
+                min(id), max(id), count(*)
+            FROM
+                res_partner
+            WHERE
+                is_company
+                AND active
+                AND (edicode IS NOT NULL OR einvoice_operator_id IS NOT NULL)
+        """
     )
-    for partner in partners:
-        partner._commercial_sync_to_children()
+    min_id, max_id, total = cr.fetchone()
+    if not total:
+        _logger.info('No res.partner edicode fields to synchronize')
+        return
+
+    # Process the parents in id ranges, so that every statement only
+    # touches and locks a limited part of the table
+    done = updated = 0
+    for start in range(min_id, max_id + 1, batch_size):
+        cr.execute(
+            """
+                SELECT
+                    id
+                FROM
+                    res_partner
+                WHERE
+                    is_company
+                    AND active
+                    AND (edicode IS NOT NULL OR einvoice_operator_id IS NOT NULL)
+                    AND id >= %s AND id < %s
+            """,
+            (start, start + batch_size),
+        )
+        parent_ids = [row[0] for row in cr.fetchall()]
+        if not parent_ids:
+            continue
+        updated += sync_edicode_to_children(cr, parent_ids)
+        done += len(parent_ids)
+        _logger.info('Synchronized %d/%d parents, %d children updated',
+                     done, total, updated)
 
     _logger.info('Synchronized res.partner edicode fields '
                  'from parents to children')
@@ -2,3 +2,6 @@ from . import res_partner
 from . import res_partner_operator_einvoice
 from . import res_company
 from . import res_config_settings
+from . import res_partner_edicode_import
+from . import account_move_finvoice_export
+from . import res_partner_operator_einvoice_sync
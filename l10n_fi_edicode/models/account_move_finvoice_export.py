@@ -0,0 +1,418 @@
+import logging
+import resource
+import time
+import uuid
+from datetime import timezone
+
+from lxml import etree
+
+from odoo import api, fields, models
+from odoo.tools import split_every
+from odoo.addons.l10n_fi_business_code.models.res_partner import (
+    vat_to_business_id,
+)
+from odoo.addons.l10n_fi_instrumentation import instrumentation
+
+_logger = logging.getLogger(__name__)
+
+FINVOICE_ENCODING = "ISO-8859-15"
+FINVOICE_VERSION = "3.0"
+
+SOAP_ENV = "http://schemas.xmlsoap.org/soap/envelope/"
+EBXML = "http://www.oasis-open.org/committees/ebxml-msg/schema/msg-header-2_0.xsd"
+XLINK = "http://www.w3.org/1999/xlink"
+XSI = "http://www.w3.org/2001/XMLSchema-instance"
+
+# account.move type -> Finvoice invoice type code and text
+FINVOICE_TYPES = {
+    "out_invoice": ("INV01", "LASKU"),
+    "out_refund": ("INV02", "HYVITYSLASKU"),
+}
+
+
+def _amount(value):
+    """ Finvoice amounts have a decimal comma """
+    return ("%.2f" % value).replace(".", ",")
+
+
+def _timestamp(value):
+    """ Finvoice and ebXML timestamps with the UTC offset """
+    return value.replace(tzinfo=timezone.utc).isoformat(timespec="seconds")
+
+
+def _date(value):
+    return fields.Date.to_date(value).strftime("%Y%m%d")
+
+
+def _sub(parent, tag, text=None, attrib=None, **extra):
+    element = etree.SubElement(parent, tag, attrib, **extra)
+    if text is not None:
+        element.text = str(text)
+    return element
+
+
+def build_envelope(routing, message_id, timestamp):
+    """
+    SOAP envelope with the ebXML routing header that precedes every
+    Finvoice message in a transmission file.
+
+    :param routing: dictionary with the edicodes and operator identifiers
+        `sender`, `sender_operator`, `receiver` and `receiver_operator`
+    """
+    envelope = etree.Element(
+        "{%s}Envelope" % SOAP_ENV,
+        nsmap={"SOAP-ENV": SOAP_ENV, "eb": EBXML, "xlink": XLINK},
+    )
+    header = _sub(
+        _sub(envelope, "{%s}Header" % SOAP_ENV),
+        "{%s}MessageHeader" % EBXML,
+        attrib={
+            "{%s}mustUnderstand" % SOAP_ENV: "1",
+            "{%s}version" % EBXML: "2.0",
+        },
+    )
+    for tag, party, role in (
+        ("From", routing["sender"], "Sender"),
+        ("From", routing["sender_operator"], "Intermediator"),
+        ("To", routing["receiver"], "Receiver"),
+        ("To", routing["receiver_operator"], "Intermediator"),
+    ):
+        element = _sub(header, "{%s}%s" % (EBXML, tag))
+        _sub(element, "{%s}PartyId" % EBXML, party)
+        _sub(element, "{%s}Role" % EBXML, role)
+    _sub(header, "{%s}CPAId" % EBXML, "yoursandmycpa")
+    _sub(header, "{%s}ConversationId" % EBXML)
+    _sub(header, "{%s}Service" % EBXML, "Routing")
+    _sub(header, "{%s}Action" % EBXML, "ProcessInvoice")
+    data = _sub(header, "{%s}MessageData" % EBXML)
+    _sub(data, "{%s}MessageId" % EBXML, message_id)
+    _sub(data, "{%s}Timestamp" % EBXML, timestamp)
+
+    manifest = _sub(
+        _sub(envelope, "{%s}Body" % SOAP_ENV),
+        "{%s}Manifest" % EBXML,
+        attrib={"{%s}id" % EBXML: "Manifest", "{%s}version" % EBXML: "2.0"},
+    )
+    reference = _sub(
+        manifest,
+        "{%s}Reference" % EBXML,
+        attrib={"{%s}id" % EBXML: "Finvoice", "{%s}href" % XLINK: message_id},
+    )
+    _sub(
+        reference,
+        "{%s}schema" % EBXML,
+        attrib={
+            "{%s}location" % EBXML: "http://www.finvoice.info/finvoice.xsd",
+            "{%s}version" % EBXML: FINVOICE_VERSION,
+        },
+    )
+    return envelope
+
+
+class FinvoiceWriter(object):
+    """
+    Incremental writer of a Finvoice transmission file: the XML declaration
+    followed by a SOAP envelope and a Finvoice message per invoice. Every
+    message is serialized as soon as it is written, so only one invoice is
+    held in memory at a time.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.count = 0
+        stream.write(
+            ('<?xml version="1.0" encoding="%s"?>\n' % FINVOICE_ENCODING)
+            .encode("ascii")
+        )
+
+    def write(self, *elements):
+        for element in elements:
+            self.stream.write(etree.tostring(element, encoding=FINVOICE_ENCODING,
+                                             xml_declaration=False))
+            self.stream.write(b"\n")
+        self.count += 1
+
+    def close(self):
+        self.stream.flush()
+
+
+class AccountMoveFinvoiceExport(models.AbstractModel):
+    _name = "account.move.finvoice.export"
+    _description = "Finvoice Export"
+
+    @api.model
+    def export_moves(self, moves, output, per_operator=False, batch_size=500):
+        """
+        Export customer invoices and refunds as Finvoice 3.0 messages.
+
+        The routing blocks are filled from the edicodes and eInvoice
+        operators of the company and the customer. The moves are read in
+        batches with their partners and lines prefetched once per batch, and
+        the messages are streamed to the output, so memory use does not
+        depend on the number of moves. Moves whose customer has no edicode
+        or operator are skipped.
+
+        :param moves: account.move recordset
+        :param output: binary file object, or with `per_operator` a callable
+            returning a binary file object for a receiving operator identifier
+        :param per_operator: write one file per receiving operator
+        :param batch_size: number of moves read at once
+        :return: dictionary of export statistics
+        """
+        stats = dict.fromkeys(("invoices", "skipped"), 0)
+        start = time.perf_counter()
+        writers = {}
+        self.env["account.move"].flush()
+        senders = {}
+        for move_ids in split_every(batch_size, moves.ids):
+            with instrumentation.stage("edicode.finvoice_export_chunk",
+                                       self.env.cr):
+                for routing, envelope, finvoice in self._build_messages(
+                        move_ids, senders, stats):
+                    key = routing["receiver_operator"] if per_operator else None
+                    writer = writers.get(key)
+                    if writer is None:
+                        writer = writers[key] = FinvoiceWriter(
+                            output(key) if per_operator else output
+                        )
+                    writer.write(envelope, finvoice)
+                    stats["invoices"] += 1
+            # The messages of the batch are already written out, drop the
+            # moves, partners and lines read for them
+            self.env.invalidate_all()
+        for writer in writers.values():
+            writer.close()
+
+        stats["files"] = len(writers)
+        stats["seconds"] = time.perf_counter() - start
+        # High-water mark of the whole worker process since it started, not
+        # of this export alone. ru_maxrss is in kilobytes on Linux.
+        stats["process_max_rss_kb"] = resource.getrusage(
+            resource.RUSAGE_SELF
+        ).ru_maxrss
+        _logger.info(
+            "Exported %(invoices)d Finvoice messages to %(files)d files in "
+            "%(seconds).1fs (process max RSS %(process_max_rss_kb)d kB), "
+            "%(skipped)d skipped",
+            stats,
+        )
+        return stats
+
+    @api.model
+    def _get_sender(self, company, operators):
+        """ Routing and party values of the sending company """
+        partner = company.partner_id
+        return {
+            "edicode": company.edicode,
+            "operator": operators[company.einvoice_operator_id.id][0]
+            if company.einvoice_operator_id else False,
+            "party": self._get_party_values(
+                partner.read(self._party_fields())[0]
+            ),
+            "currency": company.currency_id.name,
+            "bank_accounts": [
+                (bank.acc_number.replace(" ", ""), bank.bank_bic or "")
+                for bank in partner.bank_ids
+            ],
+        }
+
+    @api.model
+    def _party_fields(self):
+        return ["name", "vat", "street", "zip", "city", "country_id",
+                "edicode", "einvoice_operator_id"]
+
+    @api.model
+    def _get_party_values(self, partner):
+        country_code = False
+        if partner["country_id"]:
+            country_code = self.env["res.country"].browse(
+                partner["country_id"][0]
+            ).code
+        return {
+            "name": partner["name"],
+            "vat": partner["vat"],
+            "business_id": vat_to_business_id(partner["vat"]),
+            "street": partner["street"],
+            "zip": partner["zip"],
+            "city": partner["city"],
+            "country_code": country_code,
+        }
+
+    @api.model
+    def _build_messages(self, move_ids, senders, stats):
+        """
+        Read one batch of moves with everything the messages need and yield
+        (routing, envelope, finvoice) per exportable move.
+        """
+        operators = self.env[
+            "res.partner.operator.einvoice"
+        ]._get_operator_cache()[0]
+        moves = self.env["account.move"].browse(move_ids).read([
+            "name", "type", "invoice_date", "invoice_date_due", "company_id",
+            "commercial_partner_id", "currency_id", "amount_untaxed",
+            "amount_tax", "amount_total", "invoice_payment_ref",
+        ])
+        partners = {
+            partner["id"]: partner
+            for partner in self.env["res.partner"].browse(
+                {move["commercial_partner_id"][0] for move in moves
+                 if move["commercial_partner_id"]}
+            ).read(self._party_fields())
+        }
+        lines = {}
+        for line in self.env["account.move.line"].search_read(
+            [("move_id", "in", move_ids),
+             ("exclude_from_invoice_tab", "=", False)],
+            ["move_id", "name", "quantity", "price_unit", "price_subtotal",
+             "price_total", "tax_ids"],
+            order="move_id, sequence, id",
+        ):
+            lines.setdefault(line["move_id"][0], []).append(line)
+        # VAT rates of the percentage taxes of the lines
+        vat_rates = {
+            tax["id"]: tax["amount"]
+            for tax in self.env["account.tax"].browse(
+                {tax_id for move_lines in lines.values()
+                 for line in move_lines for tax_id in line["tax_ids"]}
+            ).read(["amount_type", "amount"])
+            if tax["amount_type"] == "percent"
+        }
+
+        timestamp = _timestamp(fields.Datetime.now())
+        for move in moves:
+            partner = partners.get(
+                move["commercial_partner_id"] and move["commercial_partner_id"][0]
+            )
+            company_id = move["company_id"][0]
+            if company_id not in senders:
+                senders[company_id] = self._get_sender(
+                    self.env["res.company"].browse(company_id), operators
+                )
+            sender = senders[company_id]
+            if move["type"] not in FINVOICE_TYPES or not partner \
+                    or not partner["edicode"] \
+                    or not partner["einvoice_operator_id"]:
+                stats["skipped"] += 1
+                continue
+            routing = {
+                "sender": sender["edicode"] or "",
+                "sender_operator": sender["operator"] or "",
+                "receiver": partner["edicode"],
+                "receiver_operator":
+                    operators[partner["einvoice_operator_id"][0]][0],
+            }
+            message_id = "%s/%s" % (move["name"], uuid.uuid4().hex)
+            yield (
+                routing,
+                build_envelope(routing, message_id, timestamp),
+                self._build_finvoice(
+                    move, lines.get(move["id"], []), sender,
+                    self._get_party_values(partner), routing, message_id,
+                    timestamp, vat_rates,
+                ),
+            )
+
+    @api.model
+    def _build_finvoice(self, move, lines, sender, buyer, routing, message_id,
+                        timestamp, vat_rates):
+        currency = move["currency_id"][1] if move["currency_id"] else \
+            sender["currency"]
+        finvoice = etree.Element(
+            "Finvoice",
+            {"Version": FINVOICE_VERSION,
+             "{%s}noNamespaceSchemaLocation" % XSI: "Finvoice3.0.xsd"},
+            nsmap={"xsi": XSI},
+        )
+
+        details = _sub(finvoice, "MessageTransmissionDetails")
+        element = _sub(details, "MessageSenderDetails")
+        _sub(element, "FromIdentifier", routing["sender"])
+        _sub(element, "FromIntermediator", routing["sender_operator"])
+        element = _sub(details, "MessageReceiverDetails")
+        _sub(element, "ToIdentifier", routing["receiver"])
+        _sub(element, "ToIntermediator", routing["receiver_operator"])
+        element = _sub(details, "MessageDetails")
+        _sub(element, "MessageIdentifier", message_id)
+        _sub(element, "MessageTimeStamp", timestamp)
+
+        self._build_party(finvoice, "Seller", sender["party"])
+        self._build_party(finvoice, "Buyer", buyer)
+
+        type_code, type_text = FINVOICE_TYPES[move["type"]]
+        sign = -1 if move["type"] == "out_refund" else 1
+        details = _sub(finvoice, "InvoiceDetails")
+        _sub(details, "InvoiceTypeCode", type_code)
+        _sub(details, "InvoiceTypeText", type_text)
+        _sub(details, "OriginCode", "Original")
+        _sub(details, "InvoiceNumber", move["name"])
+        if move["invoice_date"]:
+            _sub(details, "InvoiceDate", _date(move["invoice_date"]),
+                 Format="CCYYMMDD")
+        for tag, amount in (
+            ("InvoiceTotalVatExcludedAmount", move["amount_untaxed"]),
+            ("InvoiceTotalVatAmount", move["amount_tax"]),
+            ("InvoiceTotalVatIncludedAmount", move["amount_total"]),
+        ):
+            _sub(details, tag, _amount(sign * amount),
+                 AmountCurrencyIdentifier=currency)
+
+        for line in lines:
+            row = _sub(finvoice, "InvoiceRow")
+            _sub(row, "ArticleName", (line["name"] or "")[:100])
+            _sub(row, "DeliveredQuantity", _amount(line["quantity"]))
+            _sub(row, "UnitPriceAmount", _amount(line["price_unit"]),
+                 AmountCurrencyIdentifier=currency)
+            rates = [vat_rates[tax_id] for tax_id in line["tax_ids"]
+                     if tax_id in vat_rates]
+            if rates:
+                _sub(row, "RowVatRatePercent", _amount(sum(rates)))
+            _sub(row, "RowVatAmount",
+                 _amount(sign * (line["price_total"] - line["price_subtotal"])),
+                 AmountCurrencyIdentifier=currency)
+            _sub(row, "RowVatExcludedAmount",
+                 _amount(sign * line["price_subtotal"]),
+                 AmountCurrencyIdentifier=currency)
+
+        epi = _sub(finvoice, "EpiDetails")
+        element = _sub(epi, "EpiIdentificationDetails")
+        if move["invoice_date"]:
+            _sub(element, "EpiDate", _date(move["invoice_date"]),
+                 Format="CCYYMMDD")
+        _sub(element, "EpiReference", move["invoice_payment_ref"] or "")
+        element = _sub(epi, "EpiPartyDetails")
+        account, bic = sender["bank_accounts"][0] \
+            if sender["bank_accounts"] else ("", "")
+        _sub(_sub(element, "EpiBfiPartyDetails"), "EpiBfiIdentifier", bic,
+             IdentificationSchemeName="BIC")
+        beneficiary = _sub(element, "EpiBeneficiaryPartyDetails")
+        _sub(beneficiary, "EpiNameAddressDetails", sender["party"]["name"])
+        _sub(beneficiary, "EpiBei", sender["party"]["business_id"] or "")
+        _sub(beneficiary, "EpiAccountID", account,
+             IdentificationSchemeName="IBAN")
+        element = _sub(epi, "EpiPaymentInstructionDetails")
+        reference = move["invoice_payment_ref"] or ""
+        _sub(element, "EpiRemittanceInfoIdentifier", reference,
+             IdentificationSchemeName="ISO" if reference.startswith("RF")
+             else "SPY")
+        _sub(element, "EpiInstructedAmount", _amount(sign * move["amount_total"]),
+             AmountCurrencyIdentifier=currency)
+        _sub(element, "EpiCharge", ChargeOption="SHA")
+        if move["invoice_date_due"]:
+            _sub(element, "EpiDateOptionDate", _date(move["invoice_date_due"]),
+                 Format="CCYYMMDD")
+        return finvoice
+
+    @api.model
+    def _build_party(self, finvoice, role, party):
+        details = _sub(finvoice, "%sPartyDetails" % role)
+        if party["business_id"]:
+            _sub(details, "%sPartyIdentifier" % role, party["business_id"])
+        _sub(details, "%sOrganisationName" % role, party["name"])
+        if party["vat"]:
+            _sub(details, "%sOrganisationTaxCode" % role, party["vat"])
+        address = _sub(details, "%sPostalAddressDetails" % role)
+        _sub(address, "%sStreetName" % role, party["street"] or "")
+        _sub(address, "%sTownName" % role, party["city"] or "")
+        _sub(address, "%sPostCodeIdentifier" % role, party["zip"] or "")
+        if party["country_code"]:
+            _sub(address, "CountryCode", party["country_code"])
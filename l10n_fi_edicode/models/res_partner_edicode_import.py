@@ -0,0 +1,223 @@
+import csv
+import io
+import logging
+import resource
+import time
+
+from lxml import etree
+from psycopg2.extras import execute_values
+
+from odoo import api, models
+from odoo.addons.l10n_fi_business_code.models.res_partner import (
+    business_id_to_vat,
+)
+from odoo.addons.l10n_fi_instrumentation import instrumentation
+
+from .res_partner import sync_edicode_to_children
+
+_logger = logging.getLogger(__name__)
+
+# Finvoice receiver info element -> import column
+FINVOICE_RECEIVER_FIELDS = {
+    "BuyerPartyIdentifier": "business_id",
+    "BuyerOrganisationName": "name",
+    "InvoiceRecipientAddress": "edicode",
+    "InvoiceRecipientIntermediatorAddress": "operator",
+}
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def normalize_vat(value):
+    """ VAT number without whitespace and in upper case. Finnish business
+    IDs are converted to the FI VAT number form, e.g. 0123456-2 to
+    FI01234562. """
+    return business_id_to_vat(value) or "".join((value or "").split()).upper()
+
+
+def iter_csv_rows(stream, delimiter=","):
+    """
+    Stream rows from a CSV address file. The file must have a header row
+    with the columns `name`, `edicode`, `operator` and either `vat` or
+    `business_id`.
+    """
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding="utf-8-sig")
+    yield from csv.DictReader(stream, delimiter=delimiter)
+
+
+def iter_xml_rows(stream, record_tag="ReceiverInfo"):
+    """
+    Stream rows from a Finvoice receiver info XML file. Every `record_tag`
+    element is one row, and is discarded together with the already read
+    elements before it as soon as it has been read, so the memory use does
+    not grow with the size of the file.
+    """
+    row = {}
+    for event, element in etree.iterparse(stream, events=("end",)):
+        tag = _local_name(element.tag)
+        if tag in FINVOICE_RECEIVER_FIELDS:
+            row[FINVOICE_RECEIVER_FIELDS[tag]] = (element.text or "").strip()
+        elif tag == record_tag:
+            yield row
+            row = {}
+            element.clear()
+            # Cleared elements stay attached to their parent otherwise
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+
+class ResPartnerEdicodeImport(models.AbstractModel):
+    _name = "res.partner.edicode.import"
+    _description = "Partner eInvoice Address Import"
+
+    @api.model
+    def import_file(self, stream, file_format="csv", chunk_size=1000):
+        """
+        Import edicodes and eInvoice operators of partners from an
+        address file.
+
+        Company partners are matched by VAT number, ignoring spaces and
+        case, and a business ID is accepted in place of the VAT number.
+        Existing partners are updated with set-based SQL, unknown ones are
+        created, and the values are propagated to child contacts once per
+        chunk. Rows whose operator is unknown are skipped.
+
+        :param stream: binary or text file object
+        :param file_format: 'csv' or 'xml'
+        :param chunk_size: number of rows upserted at once
+        :return: dictionary of import statistics, `unknown_operators` lists
+            the operator identifiers of the skipped rows that were not found
+        """
+        if file_format == "xml":
+            rows = iter_xml_rows(stream)
+        else:
+            rows = iter_csv_rows(stream)
+
+        stats = dict.fromkeys(("rows", "updated", "created", "skipped"), 0)
+        stats["unknown_operators"] = set()
+        start = time.perf_counter()
+        chunk = []
+        for row in rows:
+            stats["rows"] += 1
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                with instrumentation.stage("edicode.import_chunk", self.env.cr):
+                    self._import_chunk(chunk, stats)
+                chunk = []
+        if chunk:
+            with instrumentation.stage("edicode.import_chunk", self.env.cr):
+                self._import_chunk(chunk, stats)
+
+        stats["unknown_operators"] = sorted(stats["unknown_operators"])
+        if stats["unknown_operators"]:
+            _logger.warning(
+                "Skipped eInvoice addresses with unknown operators: %s",
+                ", ".join(
+                    operator or "(empty)" for operator in stats["unknown_operators"]
+                ),
+            )
+        stats["seconds"] = time.perf_counter() - start
+        stats["rows_per_second"] = (
+            stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+        )
+        # Includes everything the worker did before the import, so it only
+        # shows that streaming the file did not raise the process peak
+        stats["process_max_rss_kb"] = resource.getrusage(
+            resource.RUSAGE_SELF
+        ).ru_maxrss
+        _logger.info(
+            "Imported %(rows)d eInvoice addresses in %(seconds).1fs "
+            "(%(rows_per_second).0f rows/s, "
+            "process max RSS %(process_max_rss_kb)d kB): "
+            "%(updated)d updated, %(created)d created, %(skipped)d skipped",
+            stats,
+        )
+        return stats
+
+    @api.model
+    def _import_chunk(self, rows, stats):
+        operator_ids = self.env[
+            "res.partner.operator.einvoice"
+        ]._get_operator_cache()[1]
+
+        values = {}
+        names = {}
+        for row in rows:
+            vat = normalize_vat(row.get("vat")) or business_id_to_vat(
+                row.get("business_id")
+            )
+            edicode = (row.get("edicode") or "").strip()
+            if not vat or not edicode:
+                stats["skipped"] += 1
+                continue
+            operator = (row.get("operator") or "").strip().upper()
+            operator_id = operator_ids.get(operator)
+            if not operator_id:
+                # An edicode is useless without its operator
+                stats["skipped"] += 1
+                stats["unknown_operators"].add(operator)
+                continue
+            # A VAT number repeated in the file gets the edicode and the
+            # operator of its last row
+            values[vat] = (edicode, operator_id)
+            names[vat] = (row.get("name") or "").strip()
+        if not values:
+            return
+
+        partner_model = self.env["res.partner"]
+        partner_model.flush(["vat", "edicode", "einvoice_operator_id"])
+        cr = self.env.cr
+        # Stored VAT numbers may contain spaces, e.g. FI 01234562
+        cr.execute(
+            """
+                SELECT id, upper(replace(vat, ' ', ''))
+                FROM res_partner
+                WHERE upper(replace(vat, ' ', '')) IN %s
+                  AND id = commercial_partner_id
+            """,
+            (tuple(values),),
+        )
+        existing = cr.fetchall()
+        found = {vat for dummy, vat in existing}
+        if existing:
+            execute_values(
+                cr,
+                """
+                    UPDATE
+                        res_partner AS p
+                    SET
+                        edicode = v.edicode,
+                        einvoice_operator_id = v.operator_id,
+                        write_uid = %s,
+                        write_date = (now() at time zone 'UTC')
+                    FROM
+                        (VALUES %%s) AS v(id, edicode, operator_id)
+                    WHERE
+                        p.id = v.id
+                """
+                % int(self.env.uid),
+                [(partner_id,) + values[vat] for partner_id, vat in existing],
+            )
+            stats["updated"] += len(existing)
+
+        to_create = [
+            {
+                "name": names[vat],
+                "vat": vat,
+                "is_company": True,
+                "edicode": edicode,
+                "einvoice_operator_id": operator_id,
+            }
+            for vat, (edicode, operator_id) in values.items()
+            if vat not in found and names[vat]
+        ]
+        stats["skipped"] += len(values) - len(found) - len(to_create)
+        if to_create:
+            partner_model.create(to_create)
+            stats["created"] += len(to_create)
+
+        sync_edicode_to_children(cr, [partner_id for partner_id, dummy in existing])
+        partner_model.invalidate_cache(["edicode", "einvoice_operator_id"])
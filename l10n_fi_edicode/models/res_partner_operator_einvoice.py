@@ -1,4 +1,4 @@
-from odoo import api, fields, models
+from odoo import api, fields, models, tools
 from odoo.osv import expression
 
 
@@ -8,7 +8,7 @@ class ResPartnerOperatorEinvoice(models.Model):
     _order = "sequence, id"
 
 
-    name = fields.Char(string="Operator", required=True)
+    name = fields.Char(string="Operator", required=True, index=True)
     active = fields.Boolean(string="Active", default=True)
     sequence = fields.Integer("Sequence")
     identifier = fields.Char(
@@ -34,23 +34,141 @@ class ResPartnerOperatorEinvoice(models.Model):
         ),
     ]
 
+    def init(self):
+        """
+        Add trigram indexes for substring searches when the pg_trgm
+        extension is available. `identifier` already has a unique index
+        for exact matches.
+        """
+        self.env.cr.execute(
+            "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+        )
+        if not self.env.cr.fetchone():
+            return
+        if not tools.index_exists(
+            self.env.cr, "res_partner_operator_einvoice_identifier_trgm_index"
+        ):
+            self.env.cr.execute(
+                """
+                    CREATE INDEX res_partner_operator_einvoice_identifier_trgm_index
+                    ON res_partner_operator_einvoice
+                    USING gin (identifier gin_trgm_ops)
+                """
+            )
+        if not tools.index_exists(
+            self.env.cr, "res_partner_operator_einvoice_name_trgm_index"
+        ):
+            self.env.cr.execute(
+                """
+                    CREATE INDEX res_partner_operator_einvoice_name_trgm_index
+                    ON res_partner_operator_einvoice
+                    USING gin (name gin_trgm_ops)
+                """
+            )
+
+    @api.model
+    def _get_operator_cache(self):
+        """
+        Process level cache of the whole operator table. The table only has
+        tens of rows, so it is cheaper to keep it in memory than to query it
+        for every autocomplete call.
+
+        The cache is keyed on a version of the table read with one small
+        query, so changes made by any worker are seen without clearing the
+        registry caches of all workers.
+
+        Returns a tuple (operators, identifiers) where `operators` maps ids
+        to (identifier, name, display name, active) in `_order` and
+        `identifiers` maps upper case identifiers to ids. The result is
+        shared and must not be modified.
+        """
+        self.flush()
+        # Every update gives the row a new ctid, also the raw updates of the
+        # operator list synchronization. The xmin tells apart transactions
+        # that could reuse a ctid after the page has been pruned.
+        self.env.cr.execute(
+            """
+                SELECT md5(string_agg(ctid::text || xmin::text, ','
+                                      ORDER BY id))
+                FROM res_partner_operator_einvoice
+            """
+        )
+        return self._get_operator_cache_version(self.env.cr.fetchone())
+
+    @api.model
+    @tools.ormcache("version")
+    def _get_operator_cache_version(self, version):
+        operators = {}
+        identifiers = {}
+        for operator in self.sudo().with_context(active_test=False).search([]):
+            operators[operator.id] = (
+                operator.identifier,
+                operator.name,
+                " - ".join([operator.identifier, operator.name]),
+                operator.active,
+            )
+            identifiers[operator.identifier.upper()] = operator.id
+        return operators, identifiers
+
     def name_get(self):
         """
         Overwrite core method to add value of `identifier` ("Identifier") field
         into name of recors.
         """
+        operators = self._get_operator_cache()[0]
         result = []
         for operator in self:
-            name = " - ".join([operator.identifier, operator.name])
+            cached = operators.get(operator.id)
+            if cached:
+                name = cached[2]
+            else:
+                name = " - ".join([operator.identifier, operator.name])
             result.append((operator.id, name))
         return result
 
     @api.model
     def name_search(self, name, args=None, operator="ilike", limit=100):
         args = args or []
+        if not args and self._context.get("active_test", True):
+            result = self._name_search_cached(name, operator, limit)
+            if result is not None:
+                return result
         domain = []
         if name:
             domain = ["|", ("identifier", operator, name),
                       ("name", operator, name)]
         einvoice_operators = self.search(domain + args, limit=limit)
         return einvoice_operators.name_get()
+
+    @api.model
+    def _name_search_cached(self, name, operator, limit):
+        """
+        Answer simple name searches from the operator cache. Returns None
+        when the search has to go to the database.
+        """
+        name = name or ""
+        if operator not in ("ilike", "=", "=ilike") \
+                or "%" in name or "_" in name:
+            return None
+        self.check_access_rights("read")
+        operators, identifiers = self._get_operator_cache()
+
+        # Exact match on a full identifier, e.g. HELSFIHH or 003721291126
+        operator_id = identifiers.get(name.strip().upper())
+        if operator_id and operators[operator_id][3] and (
+            operator != "=" or operators[operator_id][0] == name
+        ):
+            return [(operator_id, operators[operator_id][2])]
+        if operator != "ilike":
+            return None
+
+        needle = name.lower()
+        result = []
+        for operator_id, (identifier, op_name, display_name, active) \
+                in operators.items():
+            if active and (needle in identifier.lower()
+                           or needle in op_name.lower()):
+                result.append((operator_id, display_name))
+                if limit and len(result) >= limit:
+                    break
+        return result
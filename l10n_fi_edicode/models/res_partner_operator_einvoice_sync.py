@@ -0,0 +1,184 @@
+import logging
+
+from psycopg2.extras import execute_values
+
+from odoo import api, models
+from odoo.addons.l10n_fi_instrumentation import instrumentation
+
+from .res_partner_edicode_import import iter_csv_rows
+
+_logger = logging.getLogger(__name__)
+
+# Column of the operator list -> field. The TIEKE list has Finnish headers.
+OPERATOR_LIST_COLUMNS = {
+    "identifier": "identifier",
+    "välittäjätunnus": "identifier",
+    "tunnus": "identifier",
+    "name": "name",
+    "välittäjä": "name",
+    "nimi": "name",
+    "type": "ttype",
+    "ttype": "ttype",
+    "tyyppi": "ttype",
+}
+
+# Operator type in the list -> ttype
+OPERATOR_TYPES = {
+    "bank": "bank",
+    "pankki": "bank",
+    "broker": "broker",
+    "välittäjä": "broker",
+    "operaattori": "broker",
+}
+
+
+def iter_operator_rows(rows):
+    """
+    Normalize the rows of an operator list to (identifier, name, ttype)
+    tuples. `ttype` is None when the list has no type column or the type
+    is unknown, rows without an identifier or a name are dropped.
+    """
+    for row in rows:
+        values = {}
+        for column, value in row.items():
+            field = OPERATOR_LIST_COLUMNS.get((column or "").strip().lower())
+            if field:
+                values[field] = (value or "").strip()
+        if values.get("identifier") and values.get("name"):
+            yield (
+                values["identifier"],
+                values["name"],
+                OPERATOR_TYPES.get(values.get("ttype", "").lower()),
+            )
+
+
+class ResPartnerOperatorEinvoiceSync(models.AbstractModel):
+    _name = "res.partner.operator.einvoice.sync"
+    _description = "eInvoice Operator List Synchronization"
+
+    @api.model
+    def sync_file(self, stream, delimiter=",", archive_missing=True):
+        """
+        Synchronize the eInvoice operators with a local copy of the TIEKE
+        operator list, saved as CSV with the columns `identifier`, `name`
+        and optionally `type` (or their Finnish names).
+
+        :param stream: binary or text file object
+        :param delimiter: CSV column delimiter
+        :return: report of the changes, see `sync_rows`
+        """
+        return self.sync_rows(
+            iter_operator_rows(iter_csv_rows(stream, delimiter)),
+            archive_missing=archive_missing,
+        )
+
+    @api.model
+    def sync_rows(self, rows, archive_missing=True):
+        """
+        Create the new operators, update the renamed and reactivated ones
+        and archive the ones missing from the list. The existing operators
+        are read with one query and only the changed ones are written, so a
+        list without changes writes nothing.
+
+        :param rows: iterable of (identifier, name, ttype or None)
+        :param archive_missing: archive the active operators not in `rows`
+        :return: dictionary with the identifiers of the `created`, `updated`
+            and `archived` operators and the number of `unchanged` ones
+        """
+        operator_model = self.env["res.partner.operator.einvoice"]
+        # The updates below bypass the ORM access checks
+        operator_model.check_access_rights("write")
+        wanted = {}
+        for identifier, name, ttype in rows:
+            # Identifiers are unique case-insensitively, a later duplicate in
+            # the operator list replaces the earlier one
+            wanted[identifier.upper()] = (identifier, name, ttype)
+        report = {"created": [], "updated": [], "archived": [], "unchanged": 0}
+        if not wanted:
+            _logger.warning("Empty eInvoice operator list, nothing synchronized")
+            return report
+
+        operator_model.flush()
+        cr = self.env.cr
+        with instrumentation.stage("edicode.operator_sync", cr):
+            cr.execute(
+                """
+                    SELECT id, identifier, name, ttype, active
+                    FROM res_partner_operator_einvoice
+                """
+            )
+            existing = {row[1].upper(): row for row in cr.fetchall()}
+
+            updates = []
+            archive_ids = []
+            for key, (operator_id, identifier, name, ttype, active) \
+                    in existing.items():
+                if key not in wanted:
+                    if active and archive_missing:
+                        archive_ids.append(operator_id)
+                        report["archived"].append(identifier)
+                    continue
+                dummy, new_name, new_ttype = wanted[key]
+                new_ttype = new_ttype or ttype
+                if (name, ttype, active) == (new_name, new_ttype, True):
+                    report["unchanged"] += 1
+                    continue
+                updates.append((operator_id, new_name, new_ttype))
+                report["updated"].append(identifier)
+
+            if updates:
+                execute_values(
+                    cr,
+                    """
+                        UPDATE
+                            res_partner_operator_einvoice AS o
+                        SET
+                            name = v.name,
+                            ttype = v.ttype,
+                            active = TRUE,
+                            write_uid = %s,
+                            write_date = (now() at time zone 'UTC')
+                        FROM
+                            (VALUES %%s) AS v(id, name, ttype)
+                        WHERE
+                            o.id = v.id
+                    """
+                    % int(self.env.uid),
+                    updates,
+                )
+            if archive_ids:
+                cr.execute(
+                    """
+                        UPDATE res_partner_operator_einvoice
+                        SET active = FALSE,
+                            write_uid = %s,
+                            write_date = (now() at time zone 'UTC')
+                        WHERE id = ANY(%s)
+                    """,
+                    (self.env.uid, archive_ids),
+                )
+            if updates or archive_ids:
+                operator_model.invalidate_cache(
+                    ["name", "ttype", "active"],
+                    [row[0] for row in updates] + archive_ids,
+                )
+
+            to_create = [
+                {"identifier": identifier, "name": name,
+                 "ttype": ttype or "broker"}
+                for key, (identifier, name, ttype) in wanted.items()
+                if key not in existing
+            ]
+            if to_create:
+                operator_model.create(to_create)
+                report["created"] = [vals["identifier"] for vals in to_create]
+
+        _logger.info(
+            "Synchronized eInvoice operators: %d created, %d updated, "
+            "%d archived, %d unchanged",
+            len(report["created"]),
+            len(report["updated"]),
+            len(report["archived"]),
+            report["unchanged"],
+        )
+        return report
@@ -0,0 +1,5 @@
+from . import test_operator_einvoice
+from . import test_edicode_import
+from . import test_migration
+from . import test_finvoice_export
+from . import test_operator_sync
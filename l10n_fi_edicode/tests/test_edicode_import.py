@@ -0,0 +1,117 @@
+import io
+
+from odoo.tests import SavepointCase, tagged
+
+from ..models.res_partner_edicode_import import iter_xml_rows
+
+CSV_FILE = """vat,business_id,name,edicode,operator
+FI01234562,,Existing Company Oy,003701234567,HELSFIHH
+,7654321-2,New Company Oy,003776543210,003723327487
+,,No VAT Oy,003700000000,HELSFIHH
+1234567-1,,Spaced Company Oy,003712345671,HELSFIHH
+FI11111111,,Unknown Operator Oy,003711111111,UNKNOWN
+FI22222222,,No Operator Oy,003722222222,
+"""
+
+XML_FILE = """<?xml version="1.0" encoding="utf-8"?>
+<ReceiverInfoList>
+  <ReceiverInfo>
+    <BuyerPartyDetails>
+      <BuyerPartyIdentifier>0123456-2</BuyerPartyIdentifier>
+      <BuyerOrganisationName>Existing Company Oy</BuyerOrganisationName>
+    </BuyerPartyDetails>
+    <InvoiceRecipientDetails>
+      <InvoiceRecipientAddress>003701234567</InvoiceRecipientAddress>
+      <InvoiceRecipientIntermediatorAddress>
+        HELSFIHH
+      </InvoiceRecipientIntermediatorAddress>
+    </InvoiceRecipientDetails>
+  </ReceiverInfo>
+</ReceiverInfoList>
+"""
+
+
+@tagged("post_install", "-at_install")
+class TestEdicodeImport(SavepointCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.import_model = cls.env["res.partner.edicode.import"]
+        cls.operator = cls.env.ref("l10n_fi_edicode.operator_einvoice_helsfihh")
+        cls.company = cls.env["res.partner"].create(
+            {"name": "Existing Company Oy", "is_company": True, "vat": "FI01234562"}
+        )
+        cls.contact = cls.env["res.partner"].create(
+            {"name": "Contact", "parent_id": cls.company.id}
+        )
+        cls.spaced = cls.env["res.partner"].create(
+            {"name": "Spaced Company Oy", "is_company": True, "vat": "fi 12345671"}
+        )
+
+    def test_import_csv(self):
+        stats = self.import_model.import_file(io.StringIO(CSV_FILE))
+
+        self.assertEqual(6, stats["rows"])
+        self.assertEqual(2, stats["updated"])
+        self.assertEqual(1, stats["created"])
+        self.assertEqual(3, stats["skipped"])
+        self.assertEqual(["", "UNKNOWN"], stats["unknown_operators"])
+        self.assertTrue(stats["rows_per_second"])
+
+        self.assertEqual("003701234567", self.company.edicode)
+        self.assertEqual(self.operator, self.company.einvoice_operator_id)
+        self.assertEqual("003701234567", self.contact.edicode)
+        self.assertEqual(self.operator, self.contact.einvoice_operator_id)
+
+        created = self.env["res.partner"].search([("vat", "=", "FI76543212")])
+        self.assertEqual("New Company Oy", created.name)
+        self.assertEqual("003776543210", created.edicode)
+
+        # Matched despite the spaces and the business ID form
+        self.assertEqual("003712345671", self.spaced.edicode)
+        self.assertFalse(
+            self.env["res.partner"].search(
+                [("name", "in", ["Unknown Operator Oy", "No Operator Oy"])]
+            )
+        )
+
+    def test_import_unknown_operator_keeps_partner(self):
+        self.company.write(
+            {"edicode": "003701234567", "einvoice_operator_id": self.operator.id}
+        )
+        stats = self.import_model.import_file(
+            io.StringIO(
+                "vat,name,edicode,operator\n"
+                "FI01234562,Existing Company Oy,003709999999,UNKNOWN\n"
+            )
+        )
+        self.assertEqual(0, stats["updated"])
+        self.assertEqual("003701234567", self.company.edicode)
+        self.assertEqual(self.operator, self.company.einvoice_operator_id)
+
+    def test_import_xml(self):
+        stream = io.BytesIO(XML_FILE.encode())
+        stats = self.import_model.import_file(stream, file_format="xml")
+
+        self.assertEqual(1, stats["updated"])
+        self.assertEqual("003701234567", self.contact.edicode)
+        self.assertEqual(self.operator, self.contact.einvoice_operator_id)
+
+    def test_iter_xml_rows(self):
+        receiver_info = XML_FILE.split("<ReceiverInfoList>")[1].split(
+            "</ReceiverInfoList>"
+        )[0]
+        xml_file = "<ReceiverInfoList>%s</ReceiverInfoList>" % (
+            receiver_info * 1000
+        )
+        rows = list(iter_xml_rows(io.BytesIO(xml_file.encode())))
+        self.assertEqual(1000, len(rows))
+        self.assertEqual(
+            {
+                "business_id": "0123456-2",
+                "name": "Existing Company Oy",
+                "edicode": "003701234567",
+                "operator": "HELSFIHH",
+            },
+            rows[-1],
+        )
@@ -0,0 +1,125 @@
+import io
+
+from lxml import etree
+
+from odoo.addons.account.tests.account_test_savepoint import (
+    AccountTestInvoicingCommon,
+)
+from odoo.tests import tagged
+
+
+def parse_messages(data):
+    """ Split a Finvoice transmission file into its envelopes and messages """
+    body = data.split(b"?>", 1)[1]
+    return list(etree.fromstring(b"<Transmission>" + body + b"</Transmission>"))
+
+
+@tagged("post_install", "-at_install")
+class TestFinvoiceExport(AccountTestInvoicingCommon):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.export_model = cls.env["account.move.finvoice.export"]
+        operator_model = cls.env["res.partner.operator.einvoice"]
+        cls.operator_a = operator_model.create(
+            {"name": "Operator A", "identifier": "TESTOPA"}
+        )
+        cls.operator_b = operator_model.create(
+            {"name": "Operator B", "identifier": "TESTOPB"}
+        )
+        cls.env.company.write(
+            {"edicode": "003701234562", "einvoice_operator_id": cls.operator_a.id}
+        )
+        cls.partner_a.write(
+            {"edicode": "003711111111", "einvoice_operator_id": cls.operator_a.id}
+        )
+        cls.partner_b.write(
+            {"edicode": "003722222222", "einvoice_operator_id": cls.operator_b.id}
+        )
+        cls.moves = (
+            cls.init_invoice("out_invoice", partner=cls.partner_a)
+            | cls.init_invoice("out_invoice", partner=cls.partner_b)
+            | cls.init_invoice("out_refund", partner=cls.partner_a)
+        )
+        cls.moves.post()
+
+    def test_export_batch_file(self):
+        output = io.BytesIO()
+        stats = self.export_model.export_moves(self.moves, output, batch_size=2)
+
+        self.assertEqual(3, stats["invoices"])
+        self.assertEqual(0, stats["skipped"])
+        self.assertEqual(1, stats["files"])
+        elements = parse_messages(output.getvalue())
+        self.assertEqual(6, len(elements))
+        finvoices = elements[1::2]
+        self.assertEqual(
+            self.moves.mapped("name"),
+            [
+                finvoice.findtext("InvoiceDetails/InvoiceNumber")
+                for finvoice in finvoices
+            ],
+        )
+        self.assertEqual(
+            ["003711111111", "003722222222", "003711111111"],
+            [
+                finvoice.findtext("MessageTransmissionDetails/"
+                                  "MessageReceiverDetails/ToIdentifier")
+                for finvoice in finvoices
+            ],
+        )
+        self.assertEqual(
+            {"003701234562"},
+            {
+                finvoice.findtext("MessageTransmissionDetails/"
+                                  "MessageSenderDetails/FromIdentifier")
+                for finvoice in finvoices
+            },
+        )
+        self.assertEqual(
+            "INV02", finvoices[2].findtext("InvoiceDetails/InvoiceTypeCode")
+        )
+        timestamp = finvoices[0].findtext(
+            "MessageTransmissionDetails/MessageDetails/MessageTimeStamp"
+        )
+        self.assertTrue(timestamp.endswith("+00:00"), timestamp)
+
+    def test_export_row_vat_rate(self):
+        output = io.BytesIO()
+        self.export_model.export_moves(self.moves[:1], output)
+
+        finvoice = parse_messages(output.getvalue())[1]
+        lines = self.moves[0].invoice_line_ids.sorted(
+            lambda line: (line.sequence, line.id)
+        )
+        self.assertEqual(
+            [
+                ("%.2f" % sum(line.tax_ids.mapped("amount"))).replace(".", ",")
+                for line in lines
+            ],
+            [row.findtext("RowVatRatePercent")
+             for row in finvoice.iter("InvoiceRow")],
+        )
+
+    def test_export_per_operator(self):
+        outputs = {}
+
+        def open_output(operator):
+            return outputs.setdefault(operator, io.BytesIO())
+
+        stats = self.export_model.export_moves(
+            self.moves, open_output, per_operator=True
+        )
+
+        self.assertEqual(2, stats["files"])
+        self.assertEqual({"TESTOPA", "TESTOPB"}, set(outputs))
+        self.assertEqual(4, len(parse_messages(outputs["TESTOPA"].getvalue())))
+        self.assertEqual(2, len(parse_messages(outputs["TESTOPB"].getvalue())))
+
+    def test_export_skips_partners_without_edicode(self):
+        self.partner_b.edicode = False
+        output = io.BytesIO()
+        stats = self.export_model.export_moves(self.moves, output)
+
+        self.assertEqual(2, stats["invoices"])
+        self.assertEqual(1, stats["skipped"])
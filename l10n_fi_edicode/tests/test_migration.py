@@ -0,0 +1,103 @@
+from odoo.modules.migration import load_script
+from odoo.tests import SavepointCase, tagged
+
+MIGRATION = "l10n_fi_edicode/migrations/13.0.1.2.0/post-migrate-res-partner.py"
+
+
+@tagged("post_install", "-at_install")
+class TestEdicodeMigration(SavepointCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        partner_model = cls.env["res.partner"]
+        operators = cls.env["res.partner.operator.einvoice"].search([], limit=3)
+        cls.companies = partner_model.browse()
+        for idx in range(30):
+            company = partner_model.create(
+                {
+                    "name": "Company %d" % idx,
+                    "is_company": True,
+                    "edicode": "0037%08d" % idx if idx % 3 else False,
+                    "einvoice_operator_id": operators[idx % 3].id
+                    if idx % 2
+                    else False,
+                }
+            )
+            contact = partner_model.create(
+                {"name": "Contact %d" % idx, "parent_id": company.id}
+            )
+            partner_model.create(
+                {"name": "Sub contact %d" % idx, "parent_id": contact.id}
+            )
+            partner_model.create(
+                {
+                    "name": "Subsidiary %d" % idx,
+                    "parent_id": company.id,
+                    "is_company": True,
+                }
+            )
+            cls.companies |= company
+        # An archived company and an archived contact between a company and
+        # an active sub contact
+        archived_company = partner_model.create(
+            {
+                "name": "Archived Company",
+                "is_company": True,
+                "edicode": "003799999999",
+                "einvoice_operator_id": operators[0].id,
+            }
+        )
+        partner_model.create(
+            {"name": "Archived Company Contact", "parent_id": archived_company.id}
+        )
+        archived_company.active = False
+        archived_contact = partner_model.create(
+            {"name": "Archived Contact", "parent_id": cls.companies[1].id}
+        )
+        partner_model.create(
+            {"name": "Archived Sub contact", "parent_id": archived_contact.id}
+        )
+        archived_contact.active = False
+        cls.companies |= archived_company
+        cls.partners = partner_model.with_context(active_test=False).search(
+            [("id", "child_of", cls.companies.ids)]
+        )
+
+    def _desync(self):
+        self.env["res.partner"].flush()
+        self.env.cr.execute(
+            """
+                UPDATE res_partner
+                SET edicode = 'stale', einvoice_operator_id = NULL
+                WHERE id IN %s AND NOT is_company
+            """,
+            (tuple(self.partners.ids),),
+        )
+        self.env["res.partner"].invalidate_cache()
+
+    def _snapshot(self):
+        self.env["res.partner"].flush()
+        self.env.cr.execute(
+            """
+                SELECT id, edicode, einvoice_operator_id
+                FROM res_partner
+                WHERE id IN %s
+                ORDER BY id
+            """,
+            (tuple(self.partners.ids),),
+        )
+        return self.env.cr.fetchall()
+
+    def test_migration_matches_orm(self):
+        self._desync()
+        for partner in self.companies.filtered(
+            lambda p: p.active and (p.edicode or p.einvoice_operator_id)
+        ):
+            partner._commercial_sync_to_children()
+        expected = self._snapshot()
+
+        self._desync()
+        load_script(MIGRATION, "l10n_fi_edicode").migrate(
+            self.env.cr, "13.0.1.1.0", batch_size=7
+        )
+        self.assertEqual(expected, self._snapshot())
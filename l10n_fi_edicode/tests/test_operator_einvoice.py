@@ -0,0 +1,60 @@
+from odoo.tests import SavepointCase, tagged
+
+
+@tagged("post_install", "-at_install")
+class TestOperatorEinvoice(SavepointCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.operator_model = cls.env["res.partner.operator.einvoice"]
+        cls.operator = cls.operator_model.create(
+            {"name": "Test Operator Oy", "identifier": "TESTFIHH"}
+        )
+
+    def test_name_get(self):
+        self.assertEqual(
+            [(self.operator.id, "TESTFIHH - Test Operator Oy")],
+            self.operator.name_get(),
+        )
+
+    def test_name_search_exact_identifier(self):
+        self.assertEqual(
+            [(self.operator.id, "TESTFIHH - Test Operator Oy")],
+            self.operator_model.name_search("testfihh"),
+        )
+
+    def test_name_search_matches_database_search(self):
+        for name in ("test", "Operator", "FIHH", "Oy", ""):
+            expected = self.operator_model.search(
+                ["|", ("identifier", "ilike", name), ("name", "ilike", name)],
+                limit=100,
+            ).name_get()
+            self.assertEqual(expected, self.operator_model.name_search(name))
+
+    def test_cache_invalidated_on_write(self):
+        self.operator_model.name_search("TESTFIHH")
+        self.operator.name = "Renamed Operator Oy"
+        self.assertEqual(
+            [(self.operator.id, "TESTFIHH - Renamed Operator Oy")],
+            self.operator_model.name_search("TESTFIHH"),
+        )
+        self.operator.active = False
+        self.assertEqual([], self.operator_model.name_search("Renamed"))
+
+    def test_cache_invalidated_on_sql_update(self):
+        self.operator_model.name_search("TESTFIHH")
+        self.env.cr.execute(
+            "UPDATE res_partner_operator_einvoice SET name = %s WHERE id = %s",
+            ("Updated Operator Oy", self.operator.id),
+        )
+        self.operator.invalidate_cache(["name"], self.operator.ids)
+        self.assertEqual(
+            [(self.operator.id, "TESTFIHH - Updated Operator Oy")],
+            self.operator_model.name_search("TESTFIHH"),
+        )
+
+    def test_name_search_without_name(self):
+        self.assertEqual(
+            self.operator_model.name_search(""),
+            self.operator_model.name_search(False),
+        )
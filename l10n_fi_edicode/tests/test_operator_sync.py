@@ -0,0 +1,84 @@
+import io
+
+from odoo.exceptions import AccessError
+from odoo.tests import SavepointCase, tagged
+
+OPERATOR_LIST = """Välittäjätunnus;Välittäjä;Tyyppi
+TESTSYNC1;Test Operator One Oy;välittäjä
+TESTSYNC2;Test Operator Two Oy (renamed);pankki
+TESTSYNC3;Test Operator Three Oy;
+TESTSYNC5;Test Operator Five Oy;
+"""
+
+
+@tagged("post_install", "-at_install")
+class TestOperatorSync(SavepointCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sync_model = cls.env["res.partner.operator.einvoice.sync"]
+        cls.operator_model = cls.env["res.partner.operator.einvoice"]
+        # Only synchronize against the test operators
+        cls.operator_model.search([]).unlink()
+        cls.operators = cls.operator_model.create(
+            [
+                {"identifier": "TESTSYNC1", "name": "Test Operator One Oy"},
+                {"identifier": "TESTSYNC2", "name": "Test Operator Two Oy"},
+                {"identifier": "TESTSYNC3", "name": "Test Operator Three Oy",
+                 "active": False},
+                {"identifier": "TESTSYNC4", "name": "Test Operator Four Oy"},
+            ]
+        )
+
+    def _sync(self):
+        return self.sync_model.sync_file(
+            io.StringIO(OPERATOR_LIST), delimiter=";"
+        )
+
+    def test_sync(self):
+        report = self._sync()
+
+        self.assertEqual(["TESTSYNC5"], report["created"])
+        self.assertEqual(["TESTSYNC2", "TESTSYNC3"], sorted(report["updated"]))
+        self.assertEqual(["TESTSYNC4"], report["archived"])
+        self.assertEqual(1, report["unchanged"])
+
+        one, two, three, four = self.operators
+        self.assertEqual("Test Operator Two Oy (renamed)", two.name)
+        self.assertEqual("bank", two.ttype)
+        self.assertTrue(three.active)
+        self.assertFalse(four.active)
+        five = self.operator_model.search([("identifier", "=", "TESTSYNC5")])
+        self.assertEqual("broker", five.ttype)
+        self.assertEqual(
+            [(two.id, "TESTSYNC2 - Test Operator Two Oy (renamed)")],
+            self.operator_model.name_search("TESTSYNC2"),
+        )
+
+    def test_sync_without_changes(self):
+        self._sync()
+        report = self._sync()
+
+        self.assertEqual([], report["created"] + report["updated"]
+                         + report["archived"])
+        self.assertEqual(4, report["unchanged"])
+
+    def test_sync_empty_list(self):
+        report = self.sync_model.sync_rows([])
+
+        self.assertFalse(report["archived"])
+        self.assertTrue(self.operators[3].active)
+
+    def test_sync_access(self):
+        user = self.env["res.users"].create(
+            {
+                "name": "Operator Sync User",
+                "login": "operator_sync_user",
+                "groups_id": [(6, 0, [self.env.ref("base.group_user").id])],
+            }
+        )
+        with self.assertRaises(AccessError):
+            self.sync_model.with_user(user).sync_rows(
+                [("TESTSYNC1", "Test Operator One Oy", None)]
+            )
+        self.assertTrue(self.operators[1].active)
@@ -0,0 +1,18 @@
+# Copyright Avoin.Systems 2020
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+{
+    "name": "Finnish Localization Instrumentation",
+    "summary": "Opt-in timings and counters for the l10n_fi hot paths",
+    "version": "13.0.1.0.0",
+    "category": "Localization",
+    "website": "https://github.com/OCA/l10n-finland",
+    "author": "Avoin.Systems, Odoo Community Association (OCA)",
+    "license": "AGPL-3",
+    "depends": [
+        "base",
+    ],
+    "installable": True,
+    "data": [
+    ]
+}
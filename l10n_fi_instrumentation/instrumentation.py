@@ -0,0 +1,193 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+"""
+Opt-in instrumentation of the l10n_fi hot paths.
+
+Code is instrumented with `stage` (timings, call counts and SQL query counts
+of a block) and `count` (plain counters). Nothing is recorded unless the
+instrumentation is enabled for the process with `enable`, or a `collect`
+block is active, so the hooks cost a single list check when disabled.
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+PREFIX = "l10n_fi"
+
+
+class Metrics(object):
+    """ Collected stage timings and counters """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Stage name -> [calls, seconds, queries]
+        self.stages = defaultdict(lambda: [0, 0.0, 0])
+        self.counters = Counter()
+
+    def add_stage(self, name, seconds, queries):
+        with self._lock:
+            stage = self.stages[name]
+            stage[0] += 1
+            stage[1] += seconds
+            stage[2] += queries
+
+    def add_count(self, name, value):
+        with self._lock:
+            self.counters[name] += value
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.counters.clear()
+
+    def format_statsd(self, prefix=PREFIX, reset=False):
+        """
+        Metrics as StatsD text lines, one metric per line
+
+        :param reset: also reset the metrics, atomically, so that nothing
+            recorded meanwhile by other threads is lost
+        """
+        with self._lock:
+            lines = []
+            for name, (calls, seconds, queries) in sorted(self.stages.items()):
+                lines.append("%s.%s.calls:%d|c" % (prefix, name, calls))
+                lines.append("%s.%s.time:%.3f|ms" % (prefix, name, seconds * 1000))
+                lines.append("%s.%s.queries:%d|c" % (prefix, name, queries))
+            for name, value in sorted(self.counters.items()):
+                lines.append("%s.%s:%d|c" % (prefix, name, value))
+            if reset:
+                self.stages.clear()
+                self.counters.clear()
+        return "\n".join(lines)
+
+
+# The process wide metrics, recorded while the instrumentation is enabled
+process_metrics = Metrics()
+
+# Metrics currently recording
+_sinks = []
+
+
+class _Stage(object):
+    __slots__ = ("name", "cr", "start", "queries")
+
+    def __init__(self, name, cr):
+        self.name = name
+        self.cr = cr
+
+    def __enter__(self):
+        self.queries = self.cr.sql_log_count if self.cr else 0
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        queries = self.cr.sql_log_count - self.queries if self.cr else 0
+        for sink in list(_sinks):
+            sink.add_stage(self.name, seconds, queries)
+
+
+class _NoStage(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+def is_enabled():
+    return bool(_sinks)
+
+
+def enable():
+    """ Record into `process_metrics` from now on """
+    if process_metrics not in _sinks:
+        _sinks.append(process_metrics)
+
+
+def disable():
+    if process_metrics in _sinks:
+        _sinks.remove(process_metrics)
+
+
+def stage(name, cr=None):
+    """
+    Context manager timing a block of code.
+
+    :param name: dotted stage name, e.g. 'payment_reference.compute'
+    :param cr: optional cursor whose SQL queries are counted
+    """
+    if not _sinks:
+        return _NO_STAGE
+    return _Stage(name, cr)
+
+
+def count(name, value=1):
+    """ Increment a counter """
+    if _sinks:
+        for sink in list(_sinks):
+            sink.add_count(name, value)
+
+
+@contextmanager
+def collect():
+    """
+    Record the metrics of a block of code into a new `Metrics` object,
+    whether or not the instrumentation is enabled for the process.
+    Metrics of other threads running at the same time are included.
+    """
+    metrics = Metrics()
+    _sinks.append(metrics)
+    try:
+        yield metrics
+    finally:
+        _sinks.remove(metrics)
+
+
+def sample_size(name, default):
+    """
+    Size of a test sample or benchmark dataset, read from the environment
+    variable `L10N_FI_<name>` so that a test can be run on a larger set,
+    e.g. with L10N_FI_IBAN_SAMPLES=1000000.
+
+    :param name: upper case variable name without the prefix
+    :param default: size when the variable is not set
+    """
+    return int(os.environ.get("%s_%s" % (PREFIX.upper(), name), default))
+
+
+def start_log_exporter(interval, logger=_logger, metrics=process_metrics):
+    """
+    Log the metrics in StatsD text format every `interval` seconds and
+    reset them.
+
+    :return: `threading.Event` that stops the exporter when set
+    """
+    stop = threading.Event()
+
+    def export():
+        while not stop.wait(interval):
+            text = metrics.format_statsd(reset=True)
+            if text:
+                logger.info("l10n_fi metrics\n%s", text)
+
+    thread = threading.Thread(target=export, name="l10n_fi_metrics", daemon=True)
+    thread.start()
+    return stop
+
+
+if config.get("l10n_fi_instrumentation"):
+    enable()
+    if config.get("l10n_fi_instrumentation_interval"):
+        start_log_exporter(float(config["l10n_fi_instrumentation_interval"]))
@@ -0,0 +1,79 @@
+import logging
+import os
+import unittest
+from unittest import mock
+
+from odoo.tests import tagged
+
+# noinspection PyUnresolvedReferences
+from .. import instrumentation
+
+
+class FakeCursor(object):
+    sql_log_count = 0
+
+
+@tagged("standard", "at_install")
+class InstrumentationTest(unittest.TestCase):
+    def test_disabled(self):
+        was_enabled = instrumentation.is_enabled()
+        if was_enabled:
+            self.skipTest("Instrumentation enabled for the process")
+        with instrumentation.stage("test.disabled"):
+            instrumentation.count("test.disabled")
+        self.assertNotIn("test.disabled", instrumentation.process_metrics.stages)
+        self.assertNotIn("test.disabled", instrumentation.process_metrics.counters)
+
+    def test_collect(self):
+        cr = FakeCursor()
+        with instrumentation.collect() as metrics:
+            for dummy in range(3):
+                with instrumentation.stage("test.stage", cr):
+                    cr.sql_log_count += 2
+            instrumentation.count("test.padded", 5)
+        with instrumentation.stage("test.stage", cr):
+            pass
+
+        calls, seconds, queries = metrics.stages["test.stage"]
+        self.assertEqual(3, calls)
+        self.assertEqual(6, queries)
+        self.assertGreaterEqual(seconds, 0)
+        self.assertEqual(5, metrics.counters["test.padded"])
+
+        lines = metrics.format_statsd().splitlines()
+        self.assertIn("l10n_fi.test.stage.calls:3|c", lines)
+        self.assertIn("l10n_fi.test.stage.queries:6|c", lines)
+        self.assertIn("l10n_fi.test.padded:5|c", lines)
+
+    def test_format_statsd_reset(self):
+        metrics = instrumentation.Metrics()
+        metrics.add_count("test.reset", 2)
+        metrics.add_stage("test.reset", 0.5, 1)
+        lines = metrics.format_statsd(reset=True).splitlines()
+        self.assertIn("l10n_fi.test.reset:2|c", lines)
+        self.assertFalse(metrics.counters)
+        self.assertFalse(metrics.stages)
+        metrics.add_count("test.reset", 1)
+        self.assertEqual("l10n_fi.test.reset:1|c", metrics.format_statsd())
+        self.assertEqual(1, metrics.counters["test.reset"])
+
+    def test_log_exporter(self):
+        metrics = instrumentation.Metrics()
+        metrics.add_count("test.exported", 1)
+        logger = logging.getLogger("l10n_fi_instrumentation.test")
+        with self.assertLogs(logger, level="INFO") as logs:
+            stop = instrumentation.start_log_exporter(
+                0.01, logger=logger, metrics=metrics
+            )
+            for dummy in range(100):
+                if logs.output:
+                    break
+                stop.wait(0.01)
+            stop.set()
+        self.assertIn("l10n_fi.test.exported:1|c", logs.output[0])
+        self.assertFalse(metrics.counters)
+
+    def test_sample_size(self):
+        with mock.patch.dict(os.environ, {"L10N_FI_TEST_SAMPLES": "42"}):
+            self.assertEqual(42, instrumentation.sample_size("TEST_SAMPLES", 5))
+            self.assertEqual(5, instrumentation.sample_size("OTHER_SAMPLES", 5))
@@ -4,15 +4,20 @@
 {
     "name": "Finnish Sales Invoice Payment Reference",
     "summary": "Generate a valid invoice payment reference for sales invoices",
-    "version": "13.0.1.0.0",
+    "version": "13.0.1.1.0",
     "category": "Localization",
     "website": "https://github.com/OCA/l10n-finland",
     "author": "Avoin.Systems, Odoo Community Association (OCA)",
     "license": "AGPL-3",
     "depends": [
         "account",
+        "l10n_fi_instrumentation",
     ],
     "installable": True,
     "data": [
+        "security/ir.model.access.csv",
+        "data/ir_cron.xml",
+        "data/ir_actions_server.xml",
+        "views/account_journal_view.xml",
     ]
 }
@@ -1,15 +1,107 @@
 import logging
 
+from psycopg2.extras import execute_values
+
+from odoo.addons.l10n_fi_payment_reference.models.account_move import (
+    decode_payment_reference,
+)
+
 _logger = logging.getLogger(__name__)
 
+BATCH_SIZE = 10000
 
-def migrate(cr, version):
-    _logger.info('Migrating invoice payment references')
+
+def _create_move_id_index(cr):
+    """
+    Index account_invoice.move_id for the duration of the migration unless
+    it already is, so that every batch is an index range scan
+    """
+    cr.execute("""
+        SELECT 1
+        FROM pg_index x
+        JOIN pg_attribute a
+            ON a.attrelid = x.indrelid AND a.attnum = x.indkey[0]
+        WHERE x.indrelid = 'account_invoice'::regclass
+          AND a.attname = 'move_id'
+    """)
+    if cr.fetchone():
+        return False
+    cr.execute('CREATE INDEX account_invoice_l10n_fi_migrate_move_id_index '
+               'ON account_invoice (move_id)')
+    cr.execute('ANALYZE account_invoice')
+    return True
+
+
+def _migrate_batch(cr, start, stop):
+    """ Copy the references of the invoices of moves start...stop - 1 """
     cr.execute("""
-    UPDATE account_move AS m
-    SET invoice_payment_ref = i.payment_reference
-    FROM account_invoice AS i
-    WHERE m.id = i.move_id;
+        UPDATE account_move AS m
+        SET invoice_payment_ref = i.payment_reference
+        FROM account_invoice AS i
+        WHERE i.move_id >= %s AND i.move_id < %s
+          AND m.id = i.move_id
+          AND m.invoice_payment_ref IS DISTINCT FROM i.payment_reference
+        RETURNING m.id, m.invoice_payment_ref
+    """, (start, stop))
+    rows = cr.fetchall()
+    if rows:
+        # The stored base number was computed from the references the moves
+        # had before the migration
+        execute_values(cr, """
+            UPDATE account_move AS m
+            SET invoice_payment_ref_base = v.base
+            FROM (VALUES %s) AS v(id, base)
+            WHERE m.id = v.id
+        """, [
+            (move_id, decode_payment_reference(reference) or None)
+            for move_id, reference in rows
+        ], page_size=len(rows))
+    return len(rows)
+
+
+def count_mismatches(cr):
+    """ Number of moves whose reference differs from their invoice's """
+    cr.execute("""
+        SELECT count(*)
+        FROM account_invoice AS i
+        JOIN account_move AS m ON m.id = i.move_id
+        WHERE m.invoice_payment_ref IS DISTINCT FROM i.payment_reference
     """)
+    return cr.fetchone()[0]
+
+
+def migrate(cr, version, batch_size=BATCH_SIZE):
+    cr.execute("SELECT to_regclass('account_invoice')")
+    if not cr.fetchone()[0]:
+        _logger.info('No account_invoice table, no invoice payment '
+                     'references to migrate')
+        return 0
+
+    _logger.info('Migrating invoice payment references')
+    cr.execute('SELECT min(move_id), max(move_id), count(move_id) '
+               'FROM account_invoice')
+    min_id, max_id, total = cr.fetchone()
+    if not total:
+        _logger.info('No invoice payment references to migrate')
+        return 0
+
+    created_index = _create_move_id_index(cr)
+    # Update the moves in id ranges instead of one statement over the whole
+    # table, and skip the moves that already have the right reference so
+    # that they are neither rewritten nor logged again
+    updated = 0
+    for start in range(min_id, max_id + 1, batch_size):
+        stop = min(start + batch_size, max_id + 1)
+        updated += _migrate_batch(cr, start, stop)
+        _logger.info('Migrated invoice payment references up to move %d/%d, '
+                     '%d moves updated', stop - 1, max_id, updated)
+    if created_index:
+        cr.execute('DROP INDEX account_invoice_l10n_fi_migrate_move_id_index')
 
-    _logger.info('Migrated invoice payment references')
+    mismatches = count_mismatches(cr)
+    if mismatches:
+        _logger.warning('%d moves have a different payment reference than '
+                        'their invoice after the migration', mismatches)
+    _logger.info('Migrated invoice payment references of %d invoices, '
+                 '%d moves updated', total, updated)
+    return mismatches
@@ -1,2 +1,4 @@
 from. import account_move
 from. import account_journal
+from. import account_journal_payment_reference
+from. import res_partner
@@ -1,10 +1,21 @@
 # See LICENSE for licensing information
 
 import logging
-from odoo import models, fields
+from psycopg2.extras import execute_values
+
+from odoo import api, models, fields
+from odoo.exceptions import UserError
+
+from .account_move import (
+    compute_payment_reference_finnish,
+    compute_payment_reference_finnish_rf,
+)
 
 _logger = logging.getLogger(__name__)
 
+# Number of upcoming move names the references are pre-computed for
+PREALLOCATE_BLOCK_SIZE = 1000
+
 
 class AccountJournal(models.Model):
 
@@ -14,3 +25,224 @@ class AccountJournal(models.Model):
         ('finnish', 'Finnish Standard Reference'),
         ('finnish_rf', 'Finnish Creditor Reference (RF)'),
     ])
+    invoice_reference_preallocate = fields.Boolean(
+        string='Pre-allocate Payment References',
+        help='Compute the Finnish payment references of upcoming invoice '
+             'numbers in advance, so that posting only has to look them up. '
+             'Only applies to invoice based Finnish references.',
+    )
+
+    def _get_upcoming_move_names(self, count):
+        """ Names the journal's sequences give to the next `count` invoices
+        and refunds dated today. """
+        self.ensure_one()
+        today = fields.Date.context_today(self)
+        names = []
+        for sequence in self.sequence_id | self.refund_sequence_id:
+            date_from = None
+            number_next = sequence.number_next_actual
+            if sequence.use_date_range:
+                date_range = self.env['ir.sequence.date_range'].search([
+                    ('sequence_id', '=', sequence.id),
+                    ('date_from', '<=', today),
+                    ('date_to', '>=', today),
+                ], limit=1)
+                date_from = date_range.date_from
+                number_next = date_range.number_next_actual or 1
+            sequence = sequence.with_context(
+                ir_sequence_date=today, ir_sequence_date_range=date_from)
+            names.extend(sequence.get_next_char(number)
+                         for number in range(number_next, number_next + count))
+        return names
+
+    def _preallocate_invoice_references(self, block_size=PREALLOCATE_BLOCK_SIZE):
+        """ Pre-compute the payment references of the next `block_size`
+        invoice numbers of the journals. Only the names missing from the
+        current block are computed and inserted, and the names no longer
+        upcoming are removed, so an unchanged block is not written. Run by
+        the cron, never while posting. """
+        compute_functions = {
+            'finnish': compute_payment_reference_finnish,
+            'finnish_rf': compute_payment_reference_finnish_rf,
+        }
+        self.flush(['invoice_reference_model'])
+        cr = self.env.cr
+        for journal in self:
+            reference_model = journal.invoice_reference_model
+            compute = compute_functions.get(reference_model)
+            names = []
+            if journal.invoice_reference_preallocate and compute \
+                    and journal.invoice_reference_type == 'invoice':
+                names = journal._get_upcoming_move_names(block_size)
+            cr.execute("""
+                DELETE FROM account_journal_payment_reference
+                WHERE journal_id = %s
+                  AND (reference_model != %s OR NOT name = ANY(%s))
+                RETURNING id
+            """, (journal.id, reference_model or '', names))
+            removed = len(cr.fetchall())
+            cr.execute("""
+                SELECT name
+                FROM account_journal_payment_reference
+                WHERE journal_id = %s
+            """, (journal.id,))
+            allocated = {row[0] for row in cr.fetchall()}
+            references = {}
+            for name in names:
+                if name in allocated:
+                    continue
+                try:
+                    references[name] = compute(name)
+                except UserError:
+                    # Left for the on-the-fly computation to report
+                    continue
+            if references:
+                execute_values(cr, """
+                    INSERT INTO account_journal_payment_reference (
+                        journal_id, name, reference_model, reference,
+                        create_uid, create_date, write_uid, write_date)
+                    VALUES %s
+                """, [
+                    (journal.id, name, reference_model, reference)
+                    for name, reference in references.items()
+                ], template="""(
+                    %s, %s, %s, %s,
+                    {uid}, (now() at time zone 'UTC'),
+                    {uid}, (now() at time zone 'UTC')
+                )""".format(uid=int(self.env.uid)),
+                    page_size=len(references))
+            _logger.debug('Journal %s: %d references pre-allocated, %d '
+                          'removed', journal.name, len(references), removed)
+        self.env['account.journal.payment.reference'].invalidate_cache()
+
+    @api.model
+    def _get_preallocated_references(self, keys):
+        """
+        Pre-computed payment references of many moves, looked up with a
+        single query, e.g. for all moves posted at once.
+
+        :param keys: iterable of (journal id, move name)
+        :return: dictionary {(journal id, move name): reference} of the
+            moves in the pre-allocated blocks
+        """
+        keys = tuple(set(keys))
+        if not keys:
+            return {}
+        self.flush(['invoice_reference_model'])
+        self.env.cr.execute("""
+            SELECT r.journal_id, r.name, r.reference
+            FROM account_journal_payment_reference AS r
+            JOIN account_journal AS j ON j.id = r.journal_id
+            WHERE (r.journal_id, r.name) IN %s
+              AND r.reference_model = j.invoice_reference_model
+        """, (keys,))
+        return {
+            (journal_id, name): reference
+            for journal_id, name, reference in self.env.cr.fetchall()
+        }
+
+    @api.model
+    def _cron_preallocate_invoice_references(self):
+        self.search([
+            ('invoice_reference_preallocate', '=', True),
+        ])._preallocate_invoice_references()
+
+    def _iter_payment_reference_changes(self, chunk_size=1000, start_id=0):
+        """
+        Recompute the payment references of the open customer invoices and
+        refunds of the journal, in chunks of move ids.
+
+        Only the ids of one chunk are held in memory at a time, so this
+        scales to journals with hundreds of thousands of moves.
+
+        :param start_id: only consider moves with a greater id
+        :return: generator of (last move id of the chunk, list of
+            (move, old reference, new reference) of the changed moves)
+        """
+        self.ensure_one()
+        move_model = self.env['account.move']
+        move_model.flush(['invoice_payment_ref', 'invoice_payment_state'])
+        cr = self.env.cr
+        last_id = start_id
+        while True:
+            cr.execute("""
+                SELECT id
+                FROM account_move
+                WHERE journal_id = %s
+                  AND id > %s
+                  AND state = 'posted'
+                  AND type IN ('out_invoice', 'out_refund')
+                  AND invoice_payment_state != 'paid'
+                ORDER BY id
+                LIMIT %s
+            """, (self.id, last_id, chunk_size))
+            move_ids = [row[0] for row in cr.fetchall()]
+            if not move_ids:
+                return
+            last_id = move_ids[-1]
+            moves = move_model.browse(move_ids)
+            references = moves._get_invoice_computed_references()
+            changes = [
+                (move, move.invoice_payment_ref, references[move.id])
+                for move in moves
+                if references[move.id]
+                and references[move.id] != move.invoice_payment_ref
+            ]
+            yield last_id, changes
+            # A journal can have hundreds of thousands of open moves, drop
+            # the cached values of each chunk once it has been yielded
+            moves.invalidate_cache()
+
+    def _get_rereference_progress_key(self):
+        return 'l10n_fi_payment_reference.rereference.%d' % self.id
+
+    def _rereference_open_moves(self, chunk_size=1000, dry_run=False,
+                                commit=False, resume=True):
+        """
+        Replace the payment references of the open moves of the journals,
+        e.g. after the reference model of the journal has been changed.
+
+        :param dry_run: only report the changes, write nothing
+        :param commit: commit after every chunk and record the progress, so
+            that an interrupted run continues where it stopped. Only for
+            scripts, never from the user interface.
+        :param resume: continue from the recorded progress
+        :return: generator of (move name, old reference, new reference),
+            which must be consumed for the run to happen
+        """
+        parameters = self.env['ir.config_parameter'].sudo()
+        for journal in self:
+            key = journal._get_rereference_progress_key()
+            start_id = int(parameters.get_param(key, 0)) if resume else 0
+            if start_id:
+                _logger.info('Resuming re-referencing of journal %s after '
+                             'move %d', journal.name, start_id)
+            done = 0
+            for last_id, changes in journal._iter_payment_reference_changes(
+                    chunk_size, start_id):
+                for move, old, new in changes:
+                    yield move.name, old, new
+                if not dry_run:
+                    self.env['account.move']._write_invoice_payment_references(
+                        {move.id: new for move, old, new in changes},
+                        overwrite=True,
+                    )
+                    if commit:
+                        parameters.set_param(key, last_id)
+                        self.env.cr.commit()
+                done += len(changes)
+                _logger.info('Journal %s: %d references %s, up to move %d',
+                             journal.name, done,
+                             'to change' if dry_run else 'changed', last_id)
+            if not dry_run and commit:
+                parameters.set_param(key, False)
+                self.env.cr.commit()
+
+    def action_rereference_open_moves(self):
+        """ Server action: re-reference the open moves of the journals in
+        the current transaction. Use scripts/rereference.py for large
+        journals. """
+        # The references are written with SQL, bypassing the access checks
+        self.env['account.move'].check_access_rights('write')
+        changed = sum(1 for dummy in self._rereference_open_moves())
+        _logger.info('Re-referenced %d open moves', changed)
@@ -0,0 +1,23 @@
+# Copyright (C) Avoin.Systems 2020
+from odoo import fields, models
+
+
+class AccountJournalPaymentReference(models.Model):
+    """
+    Payment reference pre-computed for an upcoming move name of a journal.
+    Kept in the database, so that the references pre-computed by the cron
+    are shared by every worker.
+    """
+    _name = 'account.journal.payment.reference'
+    _description = 'Pre-allocated Payment Reference'
+
+    journal_id = fields.Many2one(
+        'account.journal', required=True, ondelete='cascade')
+    name = fields.Char(string='Move Name', required=True)
+    reference_model = fields.Char(required=True)
+    reference = fields.Char(required=True)
+
+    _sql_constraints = [
+        ('journal_name_uniq', 'unique(journal_id, name)',
+         'A move name can only have one pre-allocated reference per journal.'),
+    ]
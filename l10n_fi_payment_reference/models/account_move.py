@@ -1,80 +1,201 @@
 # Copyright (C) Avoin.Systems 2019
-import re
-from odoo import models, _
+import functools
+from collections import Counter
+from psycopg2.extras import execute_values
+from odoo import api, fields, models, tools, _
+from odoo.tools import split_every
 from odoo.exceptions import UserError
-import logging
+from odoo.addons.l10n_fi_instrumentation import instrumentation
+from .. import payment_reference
+# Re-exported for the code importing them from here
+# noinspection PyUnresolvedReferences
+from ..payment_reference import (  # noqa: F401
+    PaymentReferenceError,
+    PaymentReferenceMatcher,
+    _get_finnish_check_digit_generic,
+    _get_rf_check_digits_generic,
+    decode_payment_reference,
+    get_finnish_check_digit,
+    get_finnish_check_digits,
+    get_rf_check_digits,
+    get_rf_check_digits_many,
+    get_virtual_barcode,
+    get_virtual_barcodes,
+    log_number2numeric_stats,
+    normalize_payment_reference,
+    validate_payment_reference,
+    validate_payment_references,
+)
 
-log = logging.getLogger(__name__)
 
+def _raise_user_error(func):
+    """ Raise the errors of the reference functions as translated user
+    errors, for showing them in the user interface """
 
-def number2numeric(number):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except PaymentReferenceError:
+            # The only error the reference functions raise
+            raise UserError(
+                _('Invoice number must contain numeric characters'))
 
-    invoice_number = re.sub(r'\D', '', number)
+    return wrapper
 
-    if invoice_number == '' or invoice_number is False:
-        raise UserError(_('Invoice number must contain numeric characters'))
 
-    # Make sure the base number is 3...19 characters long
-    if len(invoice_number) < 3:
-        log.warning('Invoice number {} is less than 3 characters long, '
-                    'padding to 3 characters with prefix 11.'
-                    .format(invoice_number))
-        invoice_number = ('11' + invoice_number)[-3:]
-    elif len(invoice_number) > 19:
-        log.warning('Invoice number {} is over 19 characters long, '
-                    'truncating to 19 characters'.format(invoice_number))
-        invoice_number = invoice_number[:19]
+number2numeric = _raise_user_error(payment_reference.number2numeric)
+compute_payment_reference_finnish = _raise_user_error(
+    payment_reference.compute_payment_reference_finnish)
+compute_payment_reference_finnish_rf = _raise_user_error(
+    payment_reference.compute_payment_reference_finnish_rf)
 
-    return invoice_number
+payment_reference.add_adjustment_hook(
+    lambda kind: instrumentation.count('payment_reference.' + kind))
 
 
-def get_finnish_check_digit(base_number):
-    # Multiply digits from end to beginning with 7, 3 and 1 and
-    # calculate the sum of the products
-    total = sum((7, 3, 1)[idx % 3] * int(val) for idx, val in
-                enumerate(base_number[::-1]))
+# Number of moves written with one statement
+_WRITE_CHUNK_SIZE = 1000
 
-    # Subtract the sum from the next decade. 10 = 0
-    return str((10 - (total % 10)) % 10)
+# Sets the payment reference of moves and the label of their receivable and
+# payable lines in a single statement, returning the number of moves updated
+_WRITE_PAYMENT_REFERENCES_QUERY = """
+    WITH v(id, ref, base) AS (VALUES %%s),
+    moves AS (
+        UPDATE account_move AS m
+        SET invoice_payment_ref = v.ref,
+            invoice_payment_ref_base = v.base,
+            write_uid = %(uid)s,
+            write_date = (now() at time zone 'UTC')
+        FROM v
+        WHERE m.id = v.id AND %(condition)s
+        RETURNING m.id, m.invoice_payment_ref AS ref
+    ),
+    lines AS (
+        UPDATE account_move_line AS l
+        SET name = moves.ref,
+            write_uid = %(uid)s,
+            write_date = (now() at time zone 'UTC')
+        FROM moves, account_account AS a, account_account_type AS t
+        WHERE l.move_id = moves.id
+          AND a.id = l.account_id
+          AND t.id = a.user_type_id
+          AND t.type IN ('receivable', 'payable')
+        RETURNING l.id
+    )
+    SELECT (SELECT count(*) FROM moves), (SELECT count(*) FROM lines)
+"""
 
 
-def get_rf_check_digits(base_number):
-    check_base = base_number + 'RF00'
-    # 1. Convert all non-digits to digits
-    # 2. Calculate the modulo 97
-    # 3. Subtract the remainder from 98
-    # 4. Add leading zeros if necessary
-    return ''.join(
-        ['00', str(98 - (int(''.join(
-            [x if x.isdigit() else str(ord(x) - 55) for x in
-             check_base])) % 97))])[-2:]
-
+class AccountInvoiceFinnish(models.Model):
+    _inherit = 'account.move'
 
-def compute_payment_reference_finnish(number):
-    # Drop all non-numeric characters
-    invoice_number = number2numeric(number)
+    invoice_payment_ref_base = fields.Char(
+        string='Payment Reference Base Number',
+        compute='_compute_invoice_payment_ref_base',
+        store=True,
+        index=True,
+        copy=False,
+        help='Base number of a Finnish or RF payment reference, for looking '
+             'moves up by an incoming payment reference',
+    )
+    invoice_virtual_barcode = fields.Char(
+        string='Virtual Barcode',
+        compute='_compute_invoice_virtual_barcode',
+        help='Finnish bank virtual barcode of the invoice, version 4 with a '
+             'Finnish and version 5 with an RF payment reference',
+    )
 
-    # Calculate the Finnish check digit
-    check_digit = get_finnish_check_digit(invoice_number)
+    @api.depends('invoice_payment_ref')
+    def _compute_invoice_payment_ref_base(self):
+        for move in self:
+            move.invoice_payment_ref_base = \
+                decode_payment_reference(move.invoice_payment_ref)
 
-    return invoice_number + check_digit
+    @api.depends('type', 'invoice_payment_ref', 'amount_residual',
+                 'invoice_date_due', 'currency_id',
+                 'invoice_partner_bank_id.sanitized_acc_number')
+    def _compute_invoice_virtual_barcode(self):
+        euro = self.env.ref('base.EUR')
+        moves = self.filtered(
+            lambda move: move.type == 'out_invoice'
+            and move.currency_id == euro
+        )
+        barcodes = get_virtual_barcodes(
+            (move.invoice_partner_bank_id.sanitized_acc_number,
+             move.amount_residual,
+             move.invoice_payment_ref,
+             move.invoice_date_due)
+            for move in moves
+        )
+        for move, barcode in zip(moves, barcodes):
+            move.invoice_virtual_barcode = barcode
+        (self - moves).invoice_virtual_barcode = False
 
+    def _get_virtual_barcodes(self):
+        """
+        Virtual barcodes of a print run as a dictionary {move id: barcode}.
 
-def compute_payment_reference_finnish_rf(number):
-    # Drop all non-numeric characters
-    invoice_number = number2numeric(number)
+        The barcodes are not stored, as they change with the residual amount
+        and the bank account, and are only needed when printing. They are
+        computed for the whole print run in one pass.
+        """
+        return {
+            vals['id']: vals['invoice_virtual_barcode']
+            for vals in self.read(['invoice_virtual_barcode'])
+        }
 
-    # Calculate the Finnish check digit
-    invoice_number += get_finnish_check_digit(invoice_number)
+    @api.model
+    def _find_by_payment_reference(self, reference):
+        """
+        Moves whose Finnish or RF payment reference has the same base number
+        as `reference`, looked up through the indexed base number column.
+        The printed, machine readable and RF forms of a reference all find
+        the same moves.
+        """
+        base = decode_payment_reference(reference)
+        if not base:
+            return self.browse()
+        return self.search([('invoice_payment_ref_base', '=', base)])
 
-    # Calculate the RF check digits
-    rf_check_digits = get_rf_check_digits(invoice_number)
+    @api.model
+    def _find_partners_by_payment_reference(self, reference):
+        """
+        Partners matching a payment reference: the partners of the moves
+        carrying the reference, and the partners whose partner based
+        reference it is.
+        """
+        base = decode_payment_reference(reference)
+        if not base:
+            return self.env['res.partner']
+        partners = self._find_by_payment_reference(reference) \
+            .mapped('partner_id')
+        if base.isdigit():
+            finnish = base + get_finnish_check_digit(base)
+            partners |= self.env['res.partner'].search([
+                ('payment_reference_finnish', '=', finnish),
+            ])
+        return partners
 
-    return 'RF' + rf_check_digits + invoice_number
+    def post(self):
+        with instrumentation.stage('account_move.post', self.env.cr):
+            # The super assigns the references of customer invoices one at
+            # a time with a plain write. Leave them empty there and fill
+            # them for all invoices with the conditional batch update, so
+            # that a retried transaction never writes a reference twice.
+            result = super(AccountInvoiceFinnish, self.with_context(
+                l10n_fi_payment_reference_deferred=True)).post()
+            self.filtered(
+                lambda move: move.type == 'out_invoice'
+            )._set_invoice_payment_references()
+            return result
 
-
-class AccountInvoiceFinnish(models.Model):
-    _inherit = 'account.move'
+    def _get_invoice_computed_reference(self):
+        if self.env.context.get('l10n_fi_payment_reference_deferred'):
+            return False
+        with instrumentation.stage('payment_reference.compute'):
+            return super(AccountInvoiceFinnish, self) \
+                ._get_invoice_computed_reference()
 
     def _get_invoice_reference_finnish_rf_invoice(self):
         self.ensure_one()
@@ -82,7 +203,9 @@ class AccountInvoiceFinnish(models.Model):
 
     def _get_invoice_reference_finnish_rf_partner(self):
         self.ensure_one()
-        return compute_payment_reference_finnish_rf(str(self.partner_id.id))
+        return self.partner_id.payment_reference_finnish_rf \
+            or self._get_partner_payment_reference(
+                self.partner_id.id, 'finnish_rf')
 
     def _get_invoice_reference_finnish_invoice(self):
         self.ensure_one()
@@ -90,4 +213,161 @@ class AccountInvoiceFinnish(models.Model):
 
     def _get_invoice_reference_finnish_partner(self):
         self.ensure_one()
-        return compute_payment_reference_finnish(str(self.partner_id.id))
+        return self.partner_id.payment_reference_finnish \
+            or self._get_partner_payment_reference(
+                self.partner_id.id, 'finnish')
+
+    @api.model
+    @tools.ormcache('partner_id', 'reference_model')
+    def _get_partner_payment_reference(self, partner_id, reference_model):
+        """
+        Partner based payment reference, cached in a bounded LRU cache.
+        The reference only depends on the partner id, so the cache never
+        needs to be invalidated.
+
+        :param partner_id: id of the partner
+        :param reference_model: 'finnish' or 'finnish_rf'
+        """
+        if reference_model == 'finnish_rf':
+            return compute_payment_reference_finnish_rf(str(partner_id))
+        return compute_payment_reference_finnish(str(partner_id))
+
+    def _get_invoice_computed_references(self):
+        """
+        Batch counterpart of `_get_invoice_computed_reference`.
+
+        Computes the payment references of the whole recordset in one pass
+        and returns them as a dictionary {move id: reference}. The Finnish
+        reference models are computed directly from prefetched values, or
+        taken from the blocks pre-allocated for the journals, which are
+        looked up with one query for the whole recordset. Other models fall
+        back to the per-record method.
+        """
+        compute_functions = {
+            'finnish': compute_payment_reference_finnish,
+            'finnish_rf': compute_payment_reference_finnish_rf,
+        }
+        references = {}
+        stats = Counter()
+        # One query for all moves, and raw ids instead of the name_get of
+        # every partner and journal
+        moves_vals = self.read(['name', 'partner_id', 'journal_id'], load=None)
+        journal_model = self.env['account.journal']
+        preallocated = journal_model._get_preallocated_references(
+            (vals['journal_id'], vals['name']) for vals in moves_vals
+            if journal_model.browse(vals['journal_id'])
+            .invoice_reference_preallocate
+        )
+        for vals in moves_vals:
+            journal = journal_model.browse(vals['journal_id'])
+            reference_type = journal.invoice_reference_type
+            compute = compute_functions.get(journal.invoice_reference_model)
+            if reference_type == 'none':
+                references[vals['id']] = ''
+            elif compute and reference_type == 'invoice':
+                references[vals['id']] = \
+                    preallocated.get((vals['journal_id'], vals['name'])) \
+                    or compute(vals['name'], stats)
+            elif compute and reference_type == 'partner' \
+                    and vals['partner_id']:
+                references[vals['id']] = self._get_partner_payment_reference(
+                    vals['partner_id'], journal.invoice_reference_model)
+            else:
+                references[vals['id']] = \
+                    self.browse(vals['id'])._get_invoice_computed_reference()
+        log_number2numeric_stats(stats)
+        return references
+
+    def _write_invoice_payment_references(self, references, overwrite=False):
+        """
+        Write payment references with grouped SQL updates.
+
+        Sets `invoice_payment_ref` on the moves and the label of their
+        receivable and payable lines, like `post` does for a single move,
+        but with one statement per chunk of moves for the whole batch.
+
+        Unless `overwrite` is set, only empty references are filled. The
+        check and the update happen in the same statement, so concurrent
+        workers assigning references to the same moves neither overwrite
+        each other nor have to re-read the moves first.
+
+        :param references: dictionary {move id: reference}
+        :param overwrite: replace existing references as well
+        :return: number of moves whose reference was written
+        """
+        values = [(move_id, ref, decode_payment_reference(ref) or None)
+                  for move_id, ref in references.items() if ref]
+        if not values:
+            return 0
+        self.flush(['invoice_payment_ref'])
+        self.env['account.move.line'].flush(['name'])
+        query = _WRITE_PAYMENT_REFERENCES_QUERY % {
+            'uid': int(self.env.uid),
+            'condition': 'TRUE' if overwrite
+            else "COALESCE(m.invoice_payment_ref, '') = ''",
+        }
+        written = 0
+        for chunk in split_every(_WRITE_CHUNK_SIZE, values, list):
+            execute_values(self.env.cr, query, chunk, page_size=len(chunk))
+            written += self.env.cr.fetchone()[0]
+        instrumentation.count('payment_reference.already_set',
+                              len(values) - written)
+        moves = self.browse([vals[0] for vals in values])
+        moves.invalidate_cache(['invoice_payment_ref',
+                                'invoice_payment_ref_base',
+                                'invoice_virtual_barcode'])
+        self.env['account.move.line'].invalidate_cache(['name'])
+        return written
+
+    def _set_invoice_payment_references(self):
+        """
+        Compute and write the payment references of all moves in the
+        recordset that do not have one yet. Meant for bulk runs posting
+        thousands of invoices at once.
+        """
+        moves = self.filtered(lambda m: not m.invoice_payment_ref)
+        cr = self.env.cr
+        with instrumentation.stage('payment_reference.batch_compute', cr):
+            references = moves._get_invoice_computed_references()
+        with instrumentation.stage('payment_reference.batch_write', cr):
+            moves._write_invoice_payment_references(references)
+
+    def _iter_open_receivable_references(self, company_ids=None,
+                                         chunk_size=10000):
+        """
+        Yield (move id, payment reference) of every open customer invoice
+        and refund, fetching the rows in chunks of ids. Only one chunk is
+        held in memory at a time, and the caller may run other queries on
+        the cursor between the rows.
+        """
+        company_ids = company_ids or self.env.companies.ids
+        self.flush(['invoice_payment_ref', 'invoice_payment_state', 'state'])
+        cr = self.env.cr
+        last_id = 0
+        while True:
+            cr.execute("""
+                SELECT id, invoice_payment_ref
+                FROM account_move
+                WHERE id > %s
+                  AND state = 'posted'
+                  AND type IN ('out_invoice', 'out_refund')
+                  AND invoice_payment_state != 'paid'
+                  AND invoice_payment_ref IS NOT NULL
+                  AND company_id IN %s
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, tuple(company_ids), chunk_size))
+            rows = cr.fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield from rows
+
+    def _get_payment_reference_matcher(self, company_ids=None):
+        """
+        Load the payment references of all open receivables into a
+        `PaymentReferenceMatcher`. Meant to be called once per
+        reconciliation run.
+        """
+        return PaymentReferenceMatcher(
+            self._iter_open_receivable_references(company_ids))
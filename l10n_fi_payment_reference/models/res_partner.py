@@ -0,0 +1,40 @@
+# Copyright (C) Avoin.Systems 2020
+from odoo import api, fields, models
+
+
+class ResPartner(models.Model):
+    _inherit = 'res.partner'
+
+    payment_reference_finnish = fields.Char(
+        string='Finnish Payment Reference',
+        compute='_compute_payment_reference_finnish',
+        store=True,
+        index=True,
+        copy=False,
+        help='Payment reference used on invoices of journals with '
+             'partner based Finnish Standard References',
+    )
+    payment_reference_finnish_rf = fields.Char(
+        string='Finnish Creditor Reference (RF)',
+        compute='_compute_payment_reference_finnish',
+        store=True,
+        copy=False,
+        help='Payment reference used on invoices of journals with '
+             'partner based Finnish Creditor References (RF)',
+    )
+
+    # The references only depend on the id, so they are computed once when
+    # the partner is created
+    @api.depends()
+    def _compute_payment_reference_finnish(self):
+        move_model = self.env['account.move']
+        for partner in self:
+            if not partner.id:
+                partner.payment_reference_finnish = False
+                partner.payment_reference_finnish_rf = False
+                continue
+            partner.payment_reference_finnish = \
+                move_model._get_partner_payment_reference(partner.id, 'finnish')
+            partner.payment_reference_finnish_rf = \
+                move_model._get_partner_payment_reference(
+                    partner.id, 'finnish_rf')
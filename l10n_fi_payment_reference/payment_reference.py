@@ -0,0 +1,462 @@
+# Copyright (C) Avoin.Systems 2019
+"""
+Finnish and RF creditor payment references.
+
+Computation, validation and decoding of references and the bank virtual
+barcode. Only depends on the standard library, so that it can be used
+without Odoo, e.g. by scripts/references.py. The addon re-exports
+everything from `models/account_move.py`.
+"""
+import logging
+import re
+import time
+
+log = logging.getLogger(__name__)
+
+
+class PaymentReferenceError(ValueError):
+    """ A payment reference cannot be computed from the given number """
+
+
+# Functions called with 'padded' or 'truncated' whenever `number2numeric`
+# has to adjust a number, see `add_adjustment_hook`
+_adjustment_hooks = []
+
+
+def add_adjustment_hook(hook):
+    """ Call `hook(kind)` for every number padded or truncated by
+    `number2numeric`, e.g. to count them in a metrics system """
+    if hook not in _adjustment_hooks:
+        _adjustment_hooks.append(hook)
+
+
+def _notify_adjusted(kind):
+    for hook in _adjustment_hooks:
+        hook(kind)
+
+
+# Deletes every ASCII character except the digits
+_NON_DIGIT_TABLE = str.maketrans('', '', ''.join(
+    chr(char) for char in range(128) if not chr(char).isdigit()))
+_NON_DIGIT_RE = re.compile(r'\D')
+# str.isdigit() also accepts non-ASCII digits and str.isascii() is Python 3.7+
+_ASCII_DIGITS_RE = re.compile(r'[0-9]+')
+
+
+def _is_ascii_digits(value):
+    return _ASCII_DIGITS_RE.fullmatch(value) is not None
+
+
+# Minimum number of seconds between two warnings of the same kind
+_WARNING_INTERVAL = 60
+# Warning kind -> [time of the last warning, number of suppressed warnings]
+_warning_state = {}
+
+
+def _warn_rate_limited(kind, message, *args):
+    now = time.monotonic()
+    state = _warning_state.setdefault(kind, [None, 0])
+    if state[0] is not None and now - state[0] < _WARNING_INTERVAL:
+        state[1] += 1
+        return
+    if state[1]:
+        message += ' (%d similar warnings suppressed)'
+        args += (state[1],)
+    state[0], state[1] = now, 0
+    log.warning(message, *args)
+
+
+def number2numeric(number, stats=None):
+    """
+    Drop the non-numeric characters of a number and pad or truncate it
+    to a 3...19 digit base number.
+
+    :param stats: optional `collections.Counter`. When given, padded and
+        truncated numbers are counted in it under the keys 'padded' and
+        'truncated' instead of being logged one by one, see
+        `log_number2numeric_stats`.
+    """
+    invoice_number = number.translate(_NON_DIGIT_TABLE)
+    if invoice_number and not _is_ascii_digits(invoice_number):
+        # Non-ASCII characters left, let the regex sort out the digits
+        invoice_number = _NON_DIGIT_RE.sub('', invoice_number)
+
+    if not invoice_number:
+        raise PaymentReferenceError(
+            'Invoice number must contain numeric characters')
+
+    # Make sure the base number is 3...19 characters long
+    if len(invoice_number) < 3:
+        _notify_adjusted('padded')
+        if stats is not None:
+            stats['padded'] += 1
+        else:
+            _warn_rate_limited(
+                'padded', 'Invoice number %s is less than 3 characters long, '
+                'padding to 3 characters with prefix 11.', invoice_number)
+        invoice_number = ('11' + invoice_number)[-3:]
+    elif len(invoice_number) > 19:
+        _notify_adjusted('truncated')
+        if stats is not None:
+            stats['truncated'] += 1
+        else:
+            _warn_rate_limited(
+                'truncated', 'Invoice number %s is over 19 characters long, '
+                'truncating to 19 characters', invoice_number)
+        invoice_number = invoice_number[:19]
+
+    return invoice_number
+
+
+def log_number2numeric_stats(stats):
+    """ Log a one line summary of the counters collected by `number2numeric` """
+    if stats['padded'] or stats['truncated']:
+        log.warning('%d references padded, %d truncated in this batch',
+                    stats['padded'], stats['truncated'])
+
+
+# Weighted digit sums of every 1...3 digit string, weights 7, 3 and 1
+# counting from the last digit. Since the weights repeat every three digits,
+# the sum of a whole base number is the sum of its 3 digit chunks counted
+# from the end.
+_FINNISH_WEIGHT_TABLE = {'': 0}
+for _digits in range(1000):
+    _chunk = '%03d' % _digits
+    _FINNISH_WEIGHT_TABLE[_chunk] = \
+        int(_chunk[0]) + 3 * int(_chunk[1]) + 7 * int(_chunk[2])
+    _FINNISH_WEIGHT_TABLE[_chunk[1:]] = 3 * int(_chunk[1]) + 7 * int(_chunk[2])
+    _FINNISH_WEIGHT_TABLE[_chunk[2:]] = 7 * int(_chunk[2])
+del _digits, _chunk
+
+# Check digit by the weighted sum modulo 10
+_FINNISH_CHECK_DIGITS = '0987654321'
+
+# Length of the chunks the RF modulo 97 is calculated in and the
+# corresponding powers of ten modulo 97
+_RF_CHUNK_SIZE = 9
+_RF_CHUNK_FACTORS = [10 ** size % 97 for size in range(_RF_CHUNK_SIZE + 1)]
+
+# 'RF00' converted to digits
+_RF_SUFFIX = 271500
+
+
+def _get_finnish_check_digit_generic(base_number):
+    # Multiply digits from end to beginning with 7, 3 and 1 and
+    # calculate the sum of the products
+    total = sum((7, 3, 1)[idx % 3] * int(val) for idx, val in
+                enumerate(base_number[::-1]))
+
+    # Subtract the sum from the next decade. 10 = 0
+    return str((10 - (total % 10)) % 10)
+
+
+def get_finnish_check_digit(base_number):
+    if not _is_ascii_digits(base_number):
+        return _get_finnish_check_digit_generic(base_number)
+
+    # Sum the precomputed weighted sums of 3 digit chunks, starting with
+    # the possibly shorter chunk at the beginning
+    table = _FINNISH_WEIGHT_TABLE
+    head = len(base_number) % 3
+    total = table[base_number[:head]]
+    for idx in range(head, len(base_number), 3):
+        total += table[base_number[idx:idx + 3]]
+
+    return _FINNISH_CHECK_DIGITS[total % 10]
+
+
+def _get_rf_check_digits_generic(base_number):
+    check_base = base_number + 'RF00'
+    # 1. Convert all non-digits to digits
+    # 2. Calculate the modulo 97
+    # 3. Subtract the remainder from 98
+    # 4. Add leading zeros if necessary
+    return ''.join(
+        ['00', str(98 - (int(''.join(
+            [x if x.isdigit() else str(ord(x) - 55) for x in
+             check_base])) % 97))])[-2:]
+
+
+def _mod97(digits, remainder=0):
+    # Reduce the number piecewise so that no intermediate value grows
+    # beyond a few digits
+    factors = _RF_CHUNK_FACTORS
+    for idx in range(0, len(digits), _RF_CHUNK_SIZE):
+        chunk = digits[idx:idx + _RF_CHUNK_SIZE]
+        remainder = (remainder * factors[len(chunk)] + int(chunk)) % 97
+    return remainder
+
+
+def get_rf_check_digits(base_number):
+    if not _is_ascii_digits(base_number):
+        return _get_rf_check_digits_generic(base_number)
+
+    remainder = (_mod97(base_number) * 1000000 + _RF_SUFFIX) % 97
+    return '%02d' % (98 - remainder)
+
+
+def _iter_base_numbers(base_numbers):
+    # NumPy arrays are converted to Python objects in one go instead of
+    # boxing the elements one by one
+    if hasattr(base_numbers, 'tolist'):
+        base_numbers = base_numbers.tolist()
+    for base_number in base_numbers:
+        yield base_number if isinstance(base_number, str) else str(base_number)
+
+
+def get_finnish_check_digits(base_numbers):
+    """
+    Vectorized `get_finnish_check_digit`.
+
+    :param base_numbers: a sequence or NumPy array of base numbers as strings
+        or integers. Note that integers cannot carry leading zeros.
+    :return: list of check digits in the same order
+    """
+    return [get_finnish_check_digit(base_number)
+            for base_number in _iter_base_numbers(base_numbers)]
+
+
+def get_rf_check_digits_many(base_numbers):
+    """
+    Vectorized `get_rf_check_digits`.
+
+    :param base_numbers: a sequence or NumPy array of base numbers as strings
+        or integers. Note that integers cannot carry leading zeros.
+    :return: list of RF check digit pairs in the same order
+    """
+    return [get_rf_check_digits(base_number)
+            for base_number in _iter_base_numbers(base_numbers)]
+
+
+def compute_payment_reference_finnish(number, stats=None):
+    # Drop all non-numeric characters
+    invoice_number = number2numeric(number, stats)
+
+    # Calculate the Finnish check digit
+    check_digit = get_finnish_check_digit(invoice_number)
+
+    return invoice_number + check_digit
+
+
+def compute_payment_reference_finnish_rf(number, stats=None):
+    # Drop all non-numeric characters
+    invoice_number = number2numeric(number, stats)
+
+    # Calculate the Finnish check digit
+    invoice_number += get_finnish_check_digit(invoice_number)
+
+    # Calculate the RF check digits
+    rf_check_digits = get_rf_check_digits(invoice_number)
+
+    return 'RF' + rf_check_digits + invoice_number
+
+
+def _is_valid_finnish_reference(reference):
+    # 3...19 digit base number and the check digit. The base number may
+    # have leading zeros, as computed from e.g. 'INV/0001'.
+    if not 4 <= len(reference) <= 20 or not _is_ascii_digits(reference):
+        return False
+    return get_finnish_check_digit(reference[:-1]) == reference[-1]
+
+
+# 1...21 upper case alphanumeric characters after 'RF' and the check digits
+_RF_BODY_RE = re.compile(r'[0-9A-Z]{1,21}')
+
+
+def _is_valid_rf_reference(reference):
+    check_digits, body = reference[2:4], reference[4:]
+    if not _is_ascii_digits(check_digits) or not _RF_BODY_RE.fullmatch(body):
+        return False
+    if body.isdigit():
+        remainder = _mod97(body)
+    else:
+        remainder = 0
+        for char in body:
+            if char <= '9':
+                remainder = (remainder * 10 + ord(char) - 48) % 97
+            else:
+                remainder = (remainder * 100 + ord(char) - 55) % 97
+    # Move 'RF' and the check digits to the end, the result must be 1
+    remainder = (remainder * 10000 + 2715) % 97
+    return (remainder * 100 + int(check_digits)) % 97 == 1
+
+
+def validate_payment_reference(reference):
+    """
+    Check whether a Finnish or RF creditor reference is valid.
+
+    Spaces are allowed, e.g. as printed on invoices. The check runs in linear
+    time and returns False for any malformed input instead of raising.
+
+    :param reference: payment reference as a string
+    :return: True if the reference is valid
+    """
+    if not reference or not isinstance(reference, str):
+        return False
+    if ' ' in reference:
+        reference = reference.replace(' ', '')
+    if reference[:2].upper() == 'RF':
+        return _is_valid_rf_reference(reference.upper())
+    return _is_valid_finnish_reference(reference)
+
+
+def validate_payment_references(references):
+    """
+    Validate many payment references at once.
+
+    :param references: iterable of payment references
+    :return: bytearray bitmap, bit i (byte i // 8, bit i % 8, least
+        significant first) is set if the i-th reference is valid
+    """
+    bitmap = bytearray()
+    for idx, reference in enumerate(references):
+        byte, bit = divmod(idx, 8)
+        if not bit:
+            bitmap.append(0)
+        if validate_payment_reference(reference):
+            bitmap[byte] |= 1 << bit
+    return bitmap
+
+
+def decode_payment_reference(reference):
+    """
+    Recover the base number of a valid Finnish or RF reference, i.e. the
+    number the reference was computed from by
+    `compute_payment_reference_finnish(_rf)`, without leading zeros.
+    The RF prefix and its check digits are stripped, and so is the Finnish
+    check digit when the RF reference contains a valid Finnish reference.
+
+    E.g. '1232', 'RF111232' and '00001232' all decode to '123', and
+    '00013' and 'RF4100013', computed from 'INV/0001', both decode to '1'.
+
+    :return: the base number, or False if the reference is not valid
+    """
+    if not validate_payment_reference(reference):
+        return False
+    reference = reference.replace(' ', '').upper()
+    if reference[:2] == 'RF':
+        body = reference[4:]
+        if not _is_valid_finnish_reference(body):
+            # An RF reference around something else than a Finnish reference
+            return body.lstrip('0') or body
+        reference = body
+    # Drop the check digit before the zeros, the base number may be all zeros
+    return reference[:-1].lstrip('0') or '0'
+
+
+def normalize_payment_reference(reference):
+    """
+    Normalize a payment reference for matching.
+
+    Whitespace and leading zeros are dropped and the RF prefix with its check
+    digits is stripped, so the printed, the machine readable and the RF form
+    of the same Finnish reference all normalize to the same value.
+    E.g. 'RF18 1106', '00001106' and '1106' all become '1106'.
+    """
+    if not reference:
+        return ''
+    reference = ''.join(reference.split()).upper()
+    if reference[:2] == 'RF' and reference[2:4].isdigit():
+        reference = reference[4:]
+    return reference.lstrip('0')
+
+
+class PaymentReferenceMatcher(object):
+    """
+    Match payment references against an in-memory hash index.
+
+    The index is built once from (move id, reference) pairs, after which
+    statement lines are streamed through `match` without touching the
+    database.
+    """
+
+    def __init__(self, references):
+        self.index = {}
+        for move_id, reference in references:
+            key = normalize_payment_reference(reference)
+            if key:
+                self.index.setdefault(key, []).append(move_id)
+        self.line_count = 0
+        self.match_count = 0
+        self.elapsed = 0.0
+
+    def lookup(self, reference):
+        """ Return the ids of the moves matching the reference """
+        return self.index.get(normalize_payment_reference(reference), [])
+
+    def match(self, lines, key=None):
+        """
+        Match statement lines lazily.
+
+        :param lines: iterable of statement lines
+        :param key: function returning the reference of a line, by default
+            the lines are expected to be the references themselves
+        :return: generator of (line, list of matching move ids) tuples
+        """
+        index = self.index
+        start = time.perf_counter()
+        try:
+            for line in lines:
+                reference = key(line) if key else line
+                move_ids = index.get(normalize_payment_reference(reference), [])
+                self.line_count += 1
+                if move_ids:
+                    self.match_count += 1
+                yield line, move_ids
+        finally:
+            self.elapsed += time.perf_counter() - start
+            log.info('Matched %d of %d payment references, %.0f lines/s',
+                     self.match_count, self.line_count, self.throughput)
+
+    @property
+    def throughput(self):
+        """ Matched lines per second """
+        return self.line_count / self.elapsed if self.elapsed else 0.0
+
+
+# Largest amount a virtual barcode can carry, larger amounts are left empty
+_BARCODE_MAX_CENTS = 99999999
+
+
+def get_virtual_barcode(iban, amount, reference, due_date=None):
+    """
+    Finnish bank virtual barcode (pankkiviivakoodi) of an invoice.
+
+    Version 4 is used with a Finnish reference and version 5 with a numeric
+    RF creditor reference, as computed by
+    `compute_payment_reference_finnish(_rf)`.
+
+    :param iban: Finnish IBAN of the payee, spaces allowed
+    :param amount: amount in euros, amounts over 999999.99 are left empty
+    :param reference: Finnish or RF payment reference
+    :param due_date: date or False
+    :return: the 54 digit barcode, or False if it cannot be generated
+    """
+    iban = (iban or '').replace(' ', '').upper()
+    reference = (reference or '').replace(' ', '').upper()
+    if len(iban) != 18 or iban[:2] != 'FI' or not _is_ascii_digits(iban[2:]) \
+            or amount is None or amount < 0:
+        return False
+    cents = int(round(amount * 100))
+    if cents > _BARCODE_MAX_CENTS:
+        cents = 0
+    date = due_date.strftime('%y%m%d') if due_date else '000000'
+    if reference[:2] == 'RF':
+        body = reference[4:]
+        if not _is_ascii_digits(body) or not _is_valid_rf_reference(reference):
+            return False
+        return '5%s%08d%s%s%s' % (iban[2:], cents, reference[2:4],
+                                  body.zfill(21), date)
+    if not _is_valid_finnish_reference(reference):
+        return False
+    return '4%s%08d000%s%s' % (iban[2:], cents, reference.zfill(20), date)
+
+
+def get_virtual_barcodes(rows):
+    """
+    Generate the virtual barcodes of many invoices at once.
+
+    :param rows: iterable of (iban, amount, reference, due date) tuples
+    :return: list of barcodes, False where none can be generated
+    """
+    return [get_virtual_barcode(*row) for row in rows]
@@ -1,2 +1,9 @@
 from . import test_references
 from . import test_get_reference
+from . import test_batch_reference
+from . import test_check_digits
+from . import test_reference_matcher
+from . import test_validate_reference
+from . import test_migration
+from . import test_virtual_barcode
+from . import test_core
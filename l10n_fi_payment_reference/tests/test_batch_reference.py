@@ -0,0 +1,224 @@
+import logging
+import os
+import time
+
+from odoo.addons.account.tests.account_test_savepoint import AccountTestInvoicingCommon
+from odoo.exceptions import AccessError
+from odoo.tests import Form, tagged
+
+from ..models.account_move import get_virtual_barcode
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install')
+class InvoiceBatchReferenceTest(AccountTestInvoicingCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super(InvoiceBatchReferenceTest, cls).setUpClass()
+
+        cls.invoices = cls.init_invoice('out_invoice') \
+            | cls.init_invoice('out_invoice') \
+            | cls.init_invoice('out_invoice')
+
+    def _assert_batch_equals_single(self, reference_type, reference_model):
+        journal = self.invoices.mapped('journal_id')
+        journal.invoice_reference_type = reference_type
+        journal.invoice_reference_model = reference_model
+        for invoice in self.invoices:
+            invoice.name = 'INV/2020/%04d' % invoice.id
+
+        references = self.invoices._get_invoice_computed_references()
+
+        for invoice in self.invoices:
+            self.assertEqual(references[invoice.id],
+                             invoice._get_invoice_computed_reference())
+
+    def test_batch_reference_finnish_invoice(self):
+        self._assert_batch_equals_single('invoice', 'finnish')
+
+    def test_batch_reference_finnish_partner(self):
+        self._assert_batch_equals_single('partner', 'finnish')
+
+    def test_batch_reference_finnish_rf_invoice(self):
+        self._assert_batch_equals_single('invoice', 'finnish_rf')
+
+    def test_batch_reference_finnish_rf_partner(self):
+        self._assert_batch_equals_single('partner', 'finnish_rf')
+
+    def test_batch_reference_odoo_invoice(self):
+        self._assert_batch_equals_single('invoice', 'odoo')
+
+    def test_set_invoice_payment_references(self):
+        self.invoices.mapped('journal_id').invoice_reference_model = 'finnish'
+        self.invoices.post()
+        self.invoices.write({'invoice_payment_ref': False})
+
+        self.invoices._set_invoice_payment_references()
+
+        for invoice in self.invoices:
+            expected = invoice._get_invoice_computed_reference()
+            self.assertEqual(invoice.invoice_payment_ref, expected)
+            lines = invoice.line_ids.filtered(
+                lambda line: line.account_id.user_type_id.type
+                in ('receivable', 'payable'))
+            self.assertTrue(lines)
+            self.assertEqual(set(lines.mapped('name')), {expected})
+
+    def test_write_only_fills_empty_references(self):
+        self.invoices.mapped('journal_id').invoice_reference_model = 'finnish'
+        self.invoices.post()
+        first, others = self.invoices[0], self.invoices[1:]
+        others.write({'invoice_payment_ref': False})
+        references = dict.fromkeys(self.invoices.ids, '1232')
+
+        self.assertEqual(
+            len(others),
+            self.invoices._write_invoice_payment_references(references),
+        )
+        self.assertNotEqual('1232', first.invoice_payment_ref)
+        self.assertEqual({'1232'}, set(others.mapped('invoice_payment_ref')))
+
+        self.assertEqual(
+            len(self.invoices),
+            self.invoices._write_invoice_payment_references(
+                references, overwrite=True),
+        )
+        self.assertEqual('1232', first.invoice_payment_ref)
+
+    def test_rereference_open_moves(self):
+        journal = self.invoices.mapped('journal_id')
+        journal.invoice_reference_model = 'odoo'
+        self.invoices.post()
+        old = {invoice.id: invoice.invoice_payment_ref
+               for invoice in self.invoices}
+        journal.invoice_reference_model = 'finnish_rf'
+        expected = {invoice.id: invoice._get_invoice_computed_reference()
+                    for invoice in self.invoices}
+
+        diff = list(journal._rereference_open_moves(chunk_size=2,
+                                                    dry_run=True))
+        self.assertEqual(
+            sorted((invoice.name, old[invoice.id], expected[invoice.id])
+                   for invoice in self.invoices),
+            sorted(diff),
+        )
+        self.assertEqual(old, {invoice.id: invoice.invoice_payment_ref
+                               for invoice in self.invoices})
+
+        list(journal._rereference_open_moves(chunk_size=2))
+        self.assertEqual(expected, {invoice.id: invoice.invoice_payment_ref
+                                    for invoice in self.invoices})
+        self.assertFalse(list(journal._rereference_open_moves()))
+
+    def test_rereference_open_moves_access(self):
+        journal = self.invoices.mapped('journal_id')
+        journal.invoice_reference_model = 'finnish'
+        self.invoices.post()
+        old = {invoice.id: invoice.invoice_payment_ref
+               for invoice in self.invoices}
+        journal.invoice_reference_model = 'finnish_rf'
+        user = self.env['res.users'].create({
+            'name': 'Rereference User',
+            'login': 'rereference_user',
+            'groups_id': [(6, 0, [self.env.ref('base.group_user').id])],
+        })
+        with self.assertRaises(AccessError):
+            journal.with_user(user).action_rereference_open_moves()
+        self.assertEqual(old, {invoice.id: invoice.invoice_payment_ref
+                               for invoice in self.invoices})
+
+    def test_iter_open_receivable_references(self):
+        self.invoices.mapped('journal_id').invoice_reference_model = 'finnish'
+        self.invoices.post()
+        expected = [(invoice.id, invoice.invoice_payment_ref)
+                    for invoice in self.invoices.sorted('id')]
+
+        rows = []
+        move_model = self.env['account.move']
+        for row in move_model._iter_open_receivable_references(chunk_size=2):
+            # Other queries on the cursor between the rows
+            self.env.cr.execute("SELECT 1")
+            rows.append(row)
+        self.assertTrue(set(expected) <= set(rows))
+        self.assertEqual(sorted(rows), rows)
+
+    def test_virtual_barcodes(self):
+        self.invoices.mapped('journal_id').invoice_reference_model = 'finnish'
+        bank = self.env['res.partner.bank'].create({
+            'acc_number': 'FI79 4406 1010 2282 69',
+            'partner_id': self.env.company.partner_id.id,
+        })
+        euro = self.env.ref('base.EUR')
+        euro.active = True
+        for invoice in self.invoices:
+            with Form(invoice) as move_form:
+                move_form.currency_id = euro
+                move_form.invoice_partner_bank_id = bank
+        self.invoices.post()
+
+        barcodes = self.invoices._get_virtual_barcodes()
+        for invoice in self.invoices:
+            self.assertEqual(
+                get_virtual_barcode(bank.acc_number, invoice.amount_residual,
+                                    invoice.invoice_payment_ref,
+                                    invoice.invoice_date_due),
+                barcodes[invoice.id],
+            )
+            self.assertTrue(barcodes[invoice.id])
+
+        references = dict.fromkeys(self.invoices.ids, '1232')
+        self.invoices._write_invoice_payment_references(
+            references, overwrite=True)
+        self.assertEqual({'1232'}, {
+            barcode[28:48].lstrip('0')
+            for barcode in self.invoices._get_virtual_barcodes().values()
+        })
+
+
+@tagged('post_install', '-at_install', '-standard', 'l10n_fi_benchmark')
+class InvoiceBatchReferenceBenchmark(AccountTestInvoicingCommon):
+    """
+    Compare the batch reference path with the per-record path.
+
+    Not run by default, select it with `--test-tags l10n_fi_benchmark`.
+    The sizes can be overridden with a comma separated list in the
+    L10N_FI_BENCHMARK_SIZES environment variable.
+    """
+
+    def _create_moves(self, count):
+        journal = self.company_data['default_journal_sale']
+        journal.invoice_reference_model = 'finnish_rf'
+        return self.env['account.move'].create([{
+            'type': 'out_invoice',
+            'name': 'INV/2020/%06d' % i,
+            'journal_id': journal.id,
+            'partner_id': self.partner_a.id,
+        } for i in range(count)])
+
+    def test_benchmark_batch_reference(self):
+        sizes = os.environ.get('L10N_FI_BENCHMARK_SIZES', '1000,10000,100000')
+        for size in [int(size) for size in sizes.split(',')]:
+            moves = self._create_moves(size)
+            self.env.invalidate_all()
+
+            start = time.perf_counter()
+            for move in moves:
+                move.write({
+                    'invoice_payment_ref': move._get_invoice_computed_reference(),
+                })
+            moves.flush()
+            single = time.perf_counter() - start
+
+            moves.write({'invoice_payment_ref': False})
+            moves.flush()
+            self.env.invalidate_all()
+
+            start = time.perf_counter()
+            moves._set_invoice_payment_references()
+            batch = time.perf_counter() - start
+
+            _logger.info('%d moves: per-record %.3fs, batch %.3fs (%.1fx)',
+                         size, single, batch, single / (batch or 1e-9))
+            moves.unlink()
@@ -0,0 +1,62 @@
+import random
+import unittest
+from odoo.tests import tagged
+from odoo.addons.l10n_fi_instrumentation import instrumentation
+# noinspection PyUnresolvedReferences
+from ..models.account_move import (
+    get_finnish_check_digit,
+    get_finnish_check_digits,
+    get_rf_check_digits,
+    get_rf_check_digits_many,
+    _get_finnish_check_digit_generic,
+    _get_rf_check_digits_generic,
+)
+
+
+@tagged('standard', 'at_install')
+class CheckDigitTest(unittest.TestCase):
+
+    """
+    The table-driven check digit functions must give exactly the same
+    results as the straightforward implementations they replace.
+    """
+
+    # Random base numbers compared with the generic implementations
+    samples = instrumentation.sample_size('CHECK_DIGIT_SAMPLES', 5000)
+
+    def test_check_digits_random(self):
+        rand = random.Random(20200101)
+        for dummy in range(self.samples):
+            base_number = str(rand.randrange(10 ** rand.randint(1, 25)))
+            self.assertEqual(
+                _get_finnish_check_digit_generic(base_number),
+                get_finnish_check_digit(base_number),
+                base_number,
+            )
+            self.assertEqual(
+                _get_rf_check_digits_generic(base_number),
+                get_rf_check_digits(base_number),
+                base_number,
+            )
+
+    def test_check_digits_leading_zeros(self):
+        for base_number in ('0', '00', '000', '0001', '0123456789'):
+            self.assertEqual(
+                _get_finnish_check_digit_generic(base_number),
+                get_finnish_check_digit(base_number),
+            )
+            self.assertEqual(
+                _get_rf_check_digits_generic(base_number),
+                get_rf_check_digits(base_number),
+            )
+
+    def test_check_digits_vectorized(self):
+        base_numbers = ['123', '132', '1234567890123456789', 26]
+        self.assertEqual(
+            [get_finnish_check_digit(str(b)) for b in base_numbers],
+            get_finnish_check_digits(base_numbers),
+        )
+        self.assertEqual(
+            [get_rf_check_digits(str(b)) for b in base_numbers],
+            get_rf_check_digits_many(base_numbers),
+        )
@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+import unittest
+from odoo.tests import tagged
+from odoo.exceptions import UserError
+# noinspection PyUnresolvedReferences
+from .. import payment_reference
+# noinspection PyUnresolvedReferences
+from ..models.account_move import number2numeric
+
+ADDON_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@tagged('standard', 'at_install')
+class PaymentReferenceCoreTest(unittest.TestCase):
+
+    def test_import_without_odoo(self):
+        subprocess.check_call([sys.executable, '-c', (
+            'import sys; sys.path.insert(0, %r); import payment_reference; '
+            'assert "odoo" not in sys.modules; '
+            'assert payment_reference.compute_payment_reference_finnish'
+            '("123") == "1232"'
+        ) % ADDON_PATH])
+
+    def test_errors(self):
+        with self.assertRaises(payment_reference.PaymentReferenceError):
+            payment_reference.number2numeric('ABC')
+        with self.assertRaises(UserError):
+            number2numeric('ABC')
+
+    def test_adjustment_hook(self):
+        kinds = []
+        payment_reference.add_adjustment_hook(kinds.append)
+        try:
+            payment_reference.number2numeric('1', {'padded': 0})
+            payment_reference.number2numeric('1' * 20, {'truncated': 0})
+        finally:
+            payment_reference._adjustment_hooks.remove(kinds.append)
+        self.assertEqual(['padded', 'truncated'], kinds)
@@ -1,5 +1,10 @@
 from odoo.addons.account.tests.account_test_savepoint import AccountTestInvoicingCommon
+from odoo.addons.l10n_fi_instrumentation import instrumentation
 from odoo.tests import tagged
+from ..models.account_move import (
+    compute_payment_reference_finnish,
+    compute_payment_reference_finnish_rf,
+)
 
 
 @tagged('post_install', '-at_install')
@@ -36,3 +41,110 @@ class InvoiceGetReferenceTest(AccountTestInvoicingCommon):
         self.invoice.journal_id.invoice_reference_model = 'finnish_rf'
         self.invoice.post()
         self.assertTrue(self.invoice.invoice_payment_ref)
+
+    def test_get_reference_finnish_partner_stored(self):
+        partner = self.invoice.partner_id
+        self.assertTrue(partner.payment_reference_finnish)
+        self.assertTrue(partner.payment_reference_finnish_rf)
+        self.invoice.journal_id.invoice_reference_type = 'partner'
+        self.invoice.journal_id.invoice_reference_model = 'finnish'
+        self.invoice.post()
+        self.assertEqual(self.invoice.invoice_payment_ref,
+                         partner.payment_reference_finnish)
+
+    def test_get_reference_finnish_partner_cache(self):
+        move_model = self.env['account.move']
+        partner_id = self.invoice.partner_id.id
+        reference = move_model._get_partner_payment_reference(
+            partner_id, 'finnish_rf')
+        self.assertTrue(reference.startswith('RF'))
+        self.assertEqual(reference, move_model._get_partner_payment_reference(
+            partner_id, 'finnish_rf'))
+
+    def test_get_reference_instrumented(self):
+        self.invoice.journal_id.invoice_reference_model = 'finnish'
+        with instrumentation.collect() as metrics:
+            self.invoice.post()
+        self.assertEqual(1, metrics.stages['account_move.post'][0])
+        self.assertTrue(metrics.stages['account_move.post'][2])
+        # Posted invoices get their references in one batch
+        self.assertEqual(
+            1, metrics.stages['payment_reference.batch_compute'][0])
+        self.assertNotIn('payment_reference.compute', metrics.stages)
+
+    def test_post_reference_lines(self):
+        self.invoice.journal_id.invoice_reference_model = 'finnish'
+        self.invoice.post()
+        reference = self.invoice.invoice_payment_ref
+        self.assertEqual(
+            compute_payment_reference_finnish(self.invoice.name), reference)
+        self.assertTrue(self.invoice.invoice_payment_ref_base)
+        lines = self.invoice.line_ids.filtered(
+            lambda line: line.account_id.user_type_id.type
+            in ('receivable', 'payable'))
+        self.assertEqual({reference}, set(lines.mapped('name')))
+
+    def test_post_keeps_existing_reference(self):
+        self.invoice.journal_id.invoice_reference_model = 'finnish'
+        self.invoice.invoice_payment_ref = '1232'
+        self.invoice.post()
+        self.assertEqual('1232', self.invoice.invoice_payment_ref)
+
+    def test_get_reference_preallocated(self):
+        journal = self.invoice.journal_id
+        journal.invoice_reference_model = 'finnish_rf'
+        journal.invoice_reference_preallocate = True
+        journal._preallocate_invoice_references(block_size=10)
+
+        upcoming = journal._get_upcoming_move_names(10)
+        self.assertTrue(upcoming)
+        self.assertEqual(
+            {(journal.id, name): compute_payment_reference_finnish_rf(name)
+             for name in upcoming},
+            journal._get_preallocated_references(
+                (journal.id, name) for name in upcoming),
+        )
+
+        # An unchanged block is not rewritten
+        block_model = self.env['account.journal.payment.reference']
+        block = block_model.search([('journal_id', '=', journal.id)])
+        self.assertEqual(len(upcoming), len(block))
+        journal._preallocate_invoice_references(block_size=10)
+        self.assertEqual(block, block_model.search(
+            [('journal_id', '=', journal.id)]))
+
+        # Names outside the block are computed on the fly
+        moves = self.invoice.copy({'name': upcoming[0]}) \
+            | self.invoice.copy({'name': 'INV/9999/1'})
+        self.assertEqual(
+            {move.id: compute_payment_reference_finnish_rf(move.name)
+             for move in moves},
+            moves._get_invoice_computed_references(),
+        )
+
+        self.invoice.post()
+        self.assertEqual(
+            self.invoice.invoice_payment_ref,
+            compute_payment_reference_finnish_rf(self.invoice.name),
+        )
+
+    def test_find_by_payment_reference(self):
+        self.invoice.journal_id.invoice_reference_model = 'finnish_rf'
+        self.invoice.post()
+        reference = self.invoice.invoice_payment_ref
+        move_model = self.env['account.move']
+
+        self.assertEqual(self.invoice,
+                         move_model._find_by_payment_reference(reference))
+        # The plain Finnish form of the same reference
+        self.assertEqual(self.invoice,
+                         move_model._find_by_payment_reference(reference[4:]))
+        self.assertFalse(move_model._find_by_payment_reference('1233'))
+
+    def test_find_partners_by_payment_reference(self):
+        partner = self.invoice.partner_id
+        self.assertEqual(
+            partner,
+            self.env['account.move']._find_partners_by_payment_reference(
+                partner.payment_reference_finnish_rf),
+        )
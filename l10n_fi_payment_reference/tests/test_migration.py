@@ -0,0 +1,102 @@
+import logging
+import time
+
+from odoo.addons.account.tests.account_test_savepoint import AccountTestInvoicingCommon
+from odoo.addons.l10n_fi_instrumentation import instrumentation
+from odoo.modules.migration import load_script
+from odoo.tests import tagged
+
+from ..models.account_move import (
+    compute_payment_reference_finnish,
+    decode_payment_reference,
+)
+
+_logger = logging.getLogger(__name__)
+
+MIGRATION = 'l10n_fi_payment_reference/migrations/13.0.1.0.0/post-migrate.py'
+
+
+@tagged('post_install', '-at_install')
+class PaymentReferenceMigrationTest(AccountTestInvoicingCommon):
+    """
+    Run the 13.0.1.0.0 migration against a synthetic account_invoice table.
+    """
+
+    def _create_account_invoice(self, size):
+        """
+        Clone a posted invoice `size` times and create a temporary
+        account_invoice table pointing to the clones like a 12.0 database
+        does, with a few invoices without a move and without a reference.
+        """
+        template = self.init_invoice('out_invoice')
+        template.post()
+        template.flush()
+        cr = self.env.cr
+        cr.execute("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name = 'account_move'
+              AND column_name NOT IN ('id', 'name', 'invoice_payment_ref',
+                                      'invoice_payment_ref_base')
+        """)
+        columns = ', '.join('"%s"' % row[0] for row in cr.fetchall())
+        cr.execute("""
+            INSERT INTO account_move (name, {columns})
+            SELECT 'MIGRATE/' || n, {columns}
+            FROM account_move, generate_series(1, %s) AS n
+            WHERE id = %s
+            RETURNING id
+        """.format(columns=columns), (size, template.id))
+        move_ids = sorted(row[0] for row in cr.fetchall())
+
+        cr.execute("""
+            CREATE TEMPORARY TABLE account_invoice (
+                id serial PRIMARY KEY,
+                move_id integer,
+                payment_reference varchar
+            )
+        """)
+        rows = []
+        for idx, move_id in enumerate(move_ids):
+            if idx % 10 == 1:
+                reference = None
+            else:
+                reference = compute_payment_reference_finnish(str(move_id))
+            rows.append((move_id, reference))
+        rows.append((None, '1232'))
+        cr.execute(
+            'INSERT INTO account_invoice (move_id, payment_reference) '
+            'SELECT * FROM unnest(%s::integer[], %s::varchar[])',
+            ([row[0] for row in rows], [row[1] for row in rows]),
+        )
+        self.env['account.move'].invalidate_cache()
+        return self.env['account.move'].browse(move_ids), dict(rows)
+
+    def test_migration(self):
+        # A larger table shows how the runtime of the id-range batches grows
+        size = instrumentation.sample_size('MIGRATION_SIZE', 100)
+        moves, expected = self._create_account_invoice(size)
+
+        start = time.perf_counter()
+        mismatches = load_script(MIGRATION, 'l10n_fi_payment_reference') \
+            .migrate(self.env.cr, '13.0.1.0.0', batch_size=max(size // 7, 1))
+        _logger.info('Migrated %d synthetic invoices in %.3fs',
+                     size, time.perf_counter() - start)
+
+        self.assertEqual(0, mismatches)
+        for move in moves:
+            self.assertEqual(expected[move.id] or False,
+                             move.invoice_payment_ref)
+            self.assertEqual(decode_payment_reference(move.invoice_payment_ref),
+                             move.invoice_payment_ref_base)
+        self.env.cr.execute(
+            "SELECT to_regclass('account_invoice_l10n_fi_migrate_move_id_index')"
+        )
+        self.assertFalse(self.env.cr.fetchone()[0])
+
+    def test_migration_without_account_invoice(self):
+        self.assertEqual(
+            0,
+            load_script(MIGRATION, 'l10n_fi_payment_reference')
+            .migrate(self.env.cr, '13.0.1.0.0'),
+        )
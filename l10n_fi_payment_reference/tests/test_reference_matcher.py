@@ -0,0 +1,49 @@
+import unittest
+from odoo.tests import tagged
+# noinspection PyUnresolvedReferences
+from ..models.account_move import (
+    PaymentReferenceMatcher,
+    compute_payment_reference_finnish,
+    compute_payment_reference_finnish_rf,
+    normalize_payment_reference,
+)
+
+
+@tagged('standard', 'at_install')
+class PaymentReferenceMatcherTest(unittest.TestCase):
+
+    def test_normalize_payment_reference(self):
+        for reference in ('1106', '00001106', ' 11 06 ', 'RF18 1106',
+                          'rf181106', 'RF1800001106'):
+            self.assertEqual('1106', normalize_payment_reference(reference))
+        self.assertEqual('', normalize_payment_reference(''))
+        self.assertEqual('', normalize_payment_reference(False))
+
+    def test_normalize_finnish_and_rf_forms(self):
+        for number in ('INV/2020/0001', '132', '123456789012345678901'):
+            self.assertEqual(
+                normalize_payment_reference(
+                    compute_payment_reference_finnish(number)),
+                normalize_payment_reference(
+                    compute_payment_reference_finnish_rf(number)),
+            )
+
+    def test_match_streamed_lines(self):
+        matcher = PaymentReferenceMatcher([
+            (1, compute_payment_reference_finnish('INV/2020/0001')),
+            (2, compute_payment_reference_finnish_rf('INV/2020/0002')),
+            (3, compute_payment_reference_finnish_rf('INV/2020/0002')),
+        ])
+        lines = [
+            {'ref': compute_payment_reference_finnish_rf('INV/2020/0001')},
+            {'ref': compute_payment_reference_finnish('INV/2020/0002')},
+            {'ref': '12345'},
+        ]
+        result = matcher.match(iter(lines), key=lambda line: line['ref'])
+        self.assertEqual(
+            [[1], [2, 3], []],
+            [move_ids for dummy, move_ids in result],
+        )
+        self.assertEqual(3, matcher.line_count)
+        self.assertEqual(2, matcher.match_count)
+        self.assertGreater(matcher.throughput, 0)
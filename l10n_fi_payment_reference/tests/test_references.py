@@ -1,9 +1,11 @@
 import unittest
+from collections import Counter
 from odoo.tests import tagged
 from odoo.exceptions import UserError
 # noinspection PyUnresolvedReferences
 from ..models.account_move \
-    import compute_payment_reference_finnish, compute_payment_reference_finnish_rf
+    import compute_payment_reference_finnish, compute_payment_reference_finnish_rf, \
+    number2numeric
 
 
 @tagged('standard', 'at_install')
@@ -67,3 +69,16 @@ class PaymentReferenceTest(unittest.TestCase):
         except UserError:
             # All good
             pass
+
+    def test_number2numeric(self):
+        self.assertEqual('2020001', number2numeric('INV/2020/001'))
+        self.assertEqual('١٢٣', number2numeric('x١٢٣'))
+        self.assertEqual('112', number2numeric('Ä-2'))
+
+        stats = Counter()
+        number2numeric('1', stats)
+        number2numeric('26', stats)
+        number2numeric('1' * 25, stats)
+        number2numeric('123', stats)
+        self.assertEqual(2, stats['padded'])
+        self.assertEqual(1, stats['truncated'])
@@ -0,0 +1,93 @@
+import random
+import unittest
+from odoo.tests import tagged
+# noinspection PyUnresolvedReferences
+from ..models.account_move import (
+    compute_payment_reference_finnish,
+    compute_payment_reference_finnish_rf,
+    decode_payment_reference,
+    validate_payment_reference,
+    validate_payment_references,
+)
+
+
+@tagged('standard', 'at_install')
+class ValidatePaymentReferenceTest(unittest.TestCase):
+
+    def test_validate_finnish(self):
+        self.assertTrue(validate_payment_reference('1232'))
+        self.assertTrue(validate_payment_reference('12345 67890 12345 67894'))
+        self.assertTrue(validate_payment_reference('0001232'))
+        self.assertTrue(validate_payment_reference('0123'))
+
+        self.assertFalse(validate_payment_reference('1233'))
+        self.assertFalse(validate_payment_reference('123'))
+        self.assertFalse(validate_payment_reference('0124'))
+        self.assertFalse(validate_payment_reference('013'))
+        self.assertFalse(validate_payment_reference('123456789012345678901'))
+        self.assertFalse(validate_payment_reference('12A2'))
+
+    def test_validate_rf(self):
+        self.assertTrue(validate_payment_reference('RF111232'))
+        self.assertTrue(validate_payment_reference('rf11 1232'))
+        # ISO 11649 example
+        self.assertTrue(validate_payment_reference('RF18 5390 0754 7034'))
+        self.assertTrue(validate_payment_reference('RF47ABC123'))
+
+        self.assertFalse(validate_payment_reference('RF121232'))
+        self.assertFalse(validate_payment_reference('RF11'))
+        self.assertFalse(validate_payment_reference('RFXX1232'))
+        self.assertFalse(validate_payment_reference('RF11123-2'))
+
+    def test_validate_leading_zeros(self):
+        # Base numbers of zero padded invoice numbers keep their zeros
+        for number, reference in (('INV/0001', '00013'), ('INV-007', '0071')):
+            self.assertEqual(reference,
+                             compute_payment_reference_finnish(number))
+            self.assertTrue(validate_payment_reference(reference))
+            self.assertTrue(validate_payment_reference(
+                compute_payment_reference_finnish_rf(number)))
+
+    def test_validate_invalid_input(self):
+        for reference in ('', None, False, 1232, ' ', 'RF', '١٢٣'):
+            self.assertFalse(validate_payment_reference(reference))
+
+    def test_validate_generated(self):
+        rand = random.Random(4)
+        for dummy in range(10000):
+            number = str(rand.randrange(10 ** rand.randint(1, 19)))
+            self.assertTrue(validate_payment_reference(
+                compute_payment_reference_finnish(number)))
+            self.assertTrue(validate_payment_reference(
+                compute_payment_reference_finnish_rf(number)))
+
+    def test_validate_bitmap(self):
+        references = ['1232', '1233', 'RF111232', 'RF121232'] * 3
+        bitmap = validate_payment_references(iter(references))
+        self.assertEqual(2, len(bitmap))
+        self.assertEqual(bytearray([0b01010101, 0b0101]), bitmap)
+        self.assertEqual(bytearray(), validate_payment_references([]))
+
+    def test_decode(self):
+        for reference in ('1232', '0001232', '123 2', 'RF111232', 'rf11 1232'):
+            self.assertEqual('123', decode_payment_reference(reference))
+        self.assertEqual('ABC123', decode_payment_reference('RF47ABC123'))
+        for reference in ('00013', 'RF4100013'):
+            self.assertEqual('1', decode_payment_reference(reference))
+        self.assertEqual('0', decode_payment_reference('0000'))
+        for reference in ('1233', 'RF121232', '', False):
+            self.assertFalse(decode_payment_reference(reference))
+
+    def test_decode_generated(self):
+        # Both forms of every computed reference decode to the base number,
+        # including zero padded invoice numbers
+        rand = random.Random(17)
+        for dummy in range(10000):
+            digits = rand.randint(3, 19)
+            number = str(rand.randrange(10 ** digits)).zfill(
+                rand.choice((3, digits)))
+            base = number.lstrip('0') or '0'
+            self.assertEqual(base, decode_payment_reference(
+                compute_payment_reference_finnish(number)), number)
+            self.assertEqual(base, decode_payment_reference(
+                compute_payment_reference_finnish_rf(number)), number)
@@ -0,0 +1,74 @@
+import datetime
+import unittest
+from odoo.tests import tagged
+# noinspection PyUnresolvedReferences
+from ..models.account_move import (
+    compute_payment_reference_finnish,
+    compute_payment_reference_finnish_rf,
+    get_virtual_barcode,
+    get_virtual_barcodes,
+)
+
+IBAN = 'FI79 4406 1010 2282 69'
+DUE_DATE = datetime.date(2010, 6, 12)
+
+
+@tagged('standard', 'at_install')
+class VirtualBarcodeTest(unittest.TestCase):
+
+    def test_version_4(self):
+        self.assertEqual(
+            '479440610102282690004829900000000868516259619897100612',
+            get_virtual_barcode(IBAN, 482.99, '86851 62596 19897', DUE_DATE),
+        )
+
+    def test_version_5(self):
+        self.assertEqual(
+            '579440610102282690004829909000000868516259619897100612',
+            get_virtual_barcode(IBAN, 482.99, 'RF09 8685 1625 9619 897',
+                                DUE_DATE),
+        )
+
+    def test_computed_references(self):
+        for compute, version in (
+            (compute_payment_reference_finnish, '4'),
+            (compute_payment_reference_finnish_rf, '5'),
+        ):
+            barcode = get_virtual_barcode(IBAN, 10, compute('INV/2020/0001'))
+            self.assertEqual(54, len(barcode))
+            self.assertEqual(version, barcode[0])
+            self.assertEqual('000000', barcode[-6:])
+
+    def test_zero_padded_invoice_number(self):
+        # Default sequences zero pad the invoice number
+        self.assertEqual(
+            '479440610102282690000100000000000000000000000013100612',
+            get_virtual_barcode(IBAN, 10, compute_payment_reference_finnish(
+                'INV/0001'), DUE_DATE),
+        )
+        self.assertEqual(
+            '579440610102282690000100041000000000000000000013100612',
+            get_virtual_barcode(IBAN, 10, compute_payment_reference_finnish_rf(
+                'INV/0001'), DUE_DATE),
+        )
+
+    def test_invalid(self):
+        self.assertEqual(
+            '479440610102282690000000000000000868516259619897100612',
+            get_virtual_barcode(IBAN, 1000000, '868516259619897', DUE_DATE),
+        )
+        self.assertFalse(get_virtual_barcode(
+            'DE89370400440532013000', 10, '868516259619897'))
+        self.assertFalse(get_virtual_barcode(IBAN, -10, '868516259619897'))
+        self.assertFalse(get_virtual_barcode(IBAN, 10, '868516259619898'))
+        self.assertFalse(get_virtual_barcode(IBAN, 10, 'RF47ABC123'))
+        self.assertFalse(get_virtual_barcode(IBAN, 10, False))
+
+    def test_batch(self):
+        rows = [
+            (IBAN, 482.99, '868516259619897', DUE_DATE),
+            (IBAN, 482.99, 'RF09868516259619897', DUE_DATE),
+            (False, 482.99, '868516259619897', DUE_DATE),
+        ]
+        self.assertEqual([get_virtual_barcode(*row) for row in rows],
+                         get_virtual_barcodes(rows))
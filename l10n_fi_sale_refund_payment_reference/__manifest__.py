@@ -2,7 +2,7 @@
 
 {
     "name": "Payment References for Sale Refunds",
-    "version": "13.0.1.0.0",
+    "version": "13.0.1.1.0",
     "license": "AGPL-3",
     "summary": "Automatically generate payment references for sale refunds",
     "author": "Avoin.Systems",
@@ -13,6 +13,8 @@
     "category": "Accounting",
     "depends": [
         "account",
+        "l10n_fi_instrumentation",
+        "l10n_fi_payment_reference",
     ],
     "data": [
     ],
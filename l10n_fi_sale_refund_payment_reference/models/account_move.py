@@ -1,4 +1,5 @@
-from odoo import api, fields, models
+from odoo import models
+from odoo.addons.l10n_fi_instrumentation import instrumentation
 
 
 class AccountMove(models.Model):
@@ -12,16 +13,29 @@ class AccountMove(models.Model):
         not just for sales invoices, but for refunds as well.
         """
         result = super().post()
-        # Repeat logic equivalent to what happens in the super
-        for move in self:
-            if move.type == 'out_refund' and not move.invoice_payment_ref:
-                to_write = {
-                    'invoice_payment_ref': move._get_invoice_computed_reference(),
-                    'line_ids': [],
-                }
-                for line in move.line_ids.filtered(
-                    lambda line: line.account_id.user_type_id.type in ('receivable', 'payable')):
-                    to_write['line_ids'].append((1, line.id, {'name': to_write['invoice_payment_ref']}))
-                move.write(to_write)
-
+        with instrumentation.stage('refund_payment_reference.post', self.env.cr):
+            self.filtered(
+                lambda move: move.type == 'out_refund' and not move.invoice_payment_ref
+            )._set_refund_payment_references()
         return result
+
+    def _set_refund_payment_references(self):
+        """
+        Set the payment reference of the refunds in the recordset.
+
+        Repeats the logic of the super, but for all refunds at once: the
+        references are computed with `_get_invoice_computed_references` and
+        written with `_write_invoice_payment_references`, so the number of
+        queries does not grow with the number of refunds, and the refunds
+        get their base number and other dependent fields like invoices do.
+
+        Only empty references are filled, and the check is part of the
+        update statement. Parallel workers posting the same refunds thus
+        never overwrite each other, and a transaction retried after a
+        serialization failure does not write anything twice.
+
+        :return: number of refunds whose reference was written
+        """
+        return self._write_invoice_payment_references(
+            self._get_invoice_computed_references()
+        )
@@ -24,3 +24,61 @@ class TestRefundGeneratesReference(AccountTestInvoicingCommon):
         self.invoice.journal_id.invoice_reference_model = 'odoo'
         self.invoice.post()
         self.assertTrue(self.invoice.invoice_payment_ref)
+
+    def test_refund_reference_lines(self):
+        self.invoice.post()
+        lines = self.invoice.line_ids.filtered(
+            lambda line: line.account_id.user_type_id.type in ('receivable', 'payable'))
+        self.assertTrue(lines)
+        self.assertEqual(set(lines.mapped('name')), {self.invoice.invoice_payment_ref})
+
+    def test_refund_reference_base(self):
+        self.invoice.journal_id.invoice_reference_model = 'finnish'
+        self.invoice.post()
+        self.assertTrue(self.invoice.invoice_payment_ref_base)
+        self.assertIn(
+            self.invoice,
+            self.env['account.move']._find_by_payment_reference(
+                self.invoice.invoice_payment_ref),
+        )
+
+    def _count_reference_queries(self, count):
+        refunds = self.env['account.move']
+        for dummy in range(count):
+            refunds |= self.init_invoice('out_refund')
+        refunds.post()
+        refunds.write({'invoice_payment_ref': False})
+        refunds.flush()
+        self.env.invalidate_all()
+
+        refunds = refunds.browse(refunds.ids)
+        queries = self.cr.sql_log_count
+        refunds._set_refund_payment_references()
+        queries = self.cr.sql_log_count - queries
+
+        for refund in refunds:
+            self.assertTrue(refund.invoice_payment_ref)
+        return queries
+
+    def test_refund_reference_query_count(self):
+        # Warm up the caches so that they don't skew the first count
+        self._count_reference_queries(1)
+        self.assertEqual(self._count_reference_queries(1),
+                         self._count_reference_queries(5))
+
+    def test_refund_reference_query_count_finnish(self):
+        journal = self.invoice.journal_id
+        for reference_model in ('finnish', 'finnish_rf'):
+            journal.invoice_reference_model = reference_model
+            for preallocate in (False, True):
+                journal.invoice_reference_preallocate = preallocate
+                self._count_reference_queries(1)
+                self.assertEqual(self._count_reference_queries(1),
+                                 self._count_reference_queries(5),
+                                 (reference_model, preallocate))
+
+    def test_refund_reference_not_overwritten(self):
+        self.invoice.post()
+        self.invoice.invoice_payment_ref = 'EXISTING'
+        self.assertEqual(0, self.invoice._set_refund_payment_references())
+        self.assertEqual('EXISTING', self.invoice.invoice_payment_ref)
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the hot paths of the l10n_fi modules.
+
+Runs against an existing database that has the modules installed. Everything
+the benchmarks create is rolled back at the end. Timings and SQL query counts
+are written to a JSON file and can be compared against a stored baseline:
+
+    python scripts/benchmark.py -c odoo.conf -d benchmark_db \\
+        --output results.json --baseline baseline.json --tolerance 0.25
+
+The script exits with status 1 when a benchmark is slower than the baseline
+by more than the tolerance or runs more SQL queries than the baseline.
+
+With --stress, the script instead measures refund reference assignment by
+1...16 parallel workers racing on the same refunds, reporting throughput and
+serialization failure retries. The stress test commits its data, so run it
+against a throwaway database.
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import threading
+import time
+
+import psycopg2
+
+import odoo
+
+_logger = logging.getLogger("l10n_fi_benchmark")
+
+BENCHMARKS = []
+
+
+def benchmark(module):
+    """ Register a benchmark that runs when `module` is installed """
+
+    def decorator(func):
+        BENCHMARKS.append((func.__name__, module, func))
+        return func
+
+    return decorator
+
+
+class Measure(object):
+    """ Context manager measuring wall time and SQL queries """
+
+    def __init__(self, cr):
+        self.cr = cr
+        self.seconds = 0.0
+        self.queries = 0
+
+    def __enter__(self):
+        self._queries = self.cr.sql_log_count
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds += time.perf_counter() - self._start
+        self.queries += self.cr.sql_log_count - self._queries
+
+
+def _create_invoices(env, move_type, count, reference_model):
+    journal = env["account.journal"].search(
+        [("type", "=", "sale"), ("company_id", "=", env.company.id)], limit=1
+    )
+    journal.invoice_reference_model = reference_model
+    partner = env["res.partner"].create({"name": "l10n_fi benchmark"})
+    return env["account.move"].create([{
+        "type": move_type,
+        "journal_id": journal.id,
+        "partner_id": partner.id,
+        "invoice_line_ids": [(0, 0, {
+            "name": "Benchmark line",
+            "quantity": 1,
+            "price_unit": 100.0,
+            "account_id": journal.default_credit_account_id.id,
+        })],
+    } for dummy in range(count)])
+
+
+@benchmark("l10n_fi_payment_reference")
+def reference_generation(env, size):
+    from odoo.addons.l10n_fi_payment_reference.models.account_move import (
+        compute_payment_reference_finnish,
+        compute_payment_reference_finnish_rf,
+    )
+    results = {}
+    numbers = {
+        "short": ["INV/2020/%05d" % idx for idx in range(size)],
+        "long": ["%019d" % (10 ** 18 + idx) for idx in range(size)],
+    }
+    for name, compute in (
+        ("finnish", compute_payment_reference_finnish),
+        ("finnish_rf", compute_payment_reference_finnish_rf),
+    ):
+        for length, values in numbers.items():
+            with Measure(env.cr) as measure:
+                for value in values:
+                    compute(value)
+            results["%s_%s" % (name, length)] = measure
+    return results
+
+
+@benchmark("l10n_fi_payment_reference")
+def post_invoices(env, size):
+    invoices = _create_invoices(env, "out_invoice", size, "finnish_rf")
+    invoices.flush()
+    with Measure(env.cr) as measure:
+        invoices.post()
+        invoices.flush()
+    return {"finnish_rf": measure}
+
+
+@benchmark("l10n_fi_sale_refund_payment_reference")
+def post_refunds(env, size):
+    refunds = _create_invoices(env, "out_refund", size, "finnish_rf")
+    refunds.flush()
+    with Measure(env.cr) as measure:
+        refunds.post()
+        refunds.flush()
+    return {"finnish_rf": measure}
+
+
+@benchmark("l10n_fi_edicode")
+def operator_name_search(env, size):
+    operator_model = env["res.partner.operator.einvoice"]
+    results = {}
+    for name, term in (("exact", "HELSFIHH"), ("partial", "pank"), ("empty", "")):
+        with Measure(env.cr) as measure:
+            for dummy in range(size):
+                operator_model.name_search(term)
+        results[name] = measure
+    return results
+
+
+@benchmark("l10n_fi_business_code")
+def business_id(env, size):
+    partners = env["res.partner"].create([{
+        "name": "l10n_fi benchmark %d" % idx,
+        "is_company": True,
+        "business_id": "%07d-0" % idx,
+    } for idx in range(size)])
+    partners.flush()
+    env.invalidate_all()
+    results = {}
+    with Measure(env.cr) as measure:
+        partners.browse(partners.ids).mapped("business_id")
+    results["compute"] = measure
+    with Measure(env.cr) as measure:
+        for idx in range(0, size, max(size // 100, 1)):
+            env["res.partner"].search([("business_id", "=", "%07d-0" % idx)])
+    results["search"] = measure
+    return results
+
+
+def run_benchmarks(env, size, selected=None):
+    env.cr.execute(
+        "SELECT name FROM ir_module_module WHERE state = 'installed'"
+    )
+    installed = {row[0] for row in env.cr.fetchall()}
+    results = {}
+    for name, module, func in BENCHMARKS:
+        if selected and name not in selected:
+            continue
+        if module not in installed:
+            _logger.info("Skipping %s, %s is not installed", name, module)
+            continue
+        for case, measure in func(env, size).items():
+            key = "%s.%s" % (name, case)
+            results[key] = {
+                "seconds": round(measure.seconds, 6),
+                "queries": measure.queries,
+                "size": size,
+            }
+            _logger.info("%s: %.3fs, %d queries", key, measure.seconds,
+                         measure.queries)
+    return results
+
+
+def _stress_worker(registry, refund_ids, chunk_size, stats, lock):
+    refund_ids = list(refund_ids)
+    random.shuffle(refund_ids)
+    with odoo.api.Environment.manage():
+        for start in range(0, len(refund_ids), chunk_size):
+            chunk = refund_ids[start:start + chunk_size]
+            while True:
+                with registry.cursor() as cr:
+                    env = odoo.api.Environment(cr, odoo.SUPERUSER_ID, {})
+                    try:
+                        written = env["account.move"].browse(chunk) \
+                            ._set_refund_payment_references()
+                        cr.commit()
+                    except psycopg2.OperationalError as error:
+                        if error.pgcode not in ("40001", "40P01"):
+                            raise
+                        cr.rollback()
+                        with lock:
+                            stats["retries"] += 1
+                        continue
+                with lock:
+                    stats["written"] += written
+                break
+
+
+def stress_refund_references(registry, size, workers_list, chunk_size=50):
+    """
+    Let parallel workers assign the references of the same refunds and
+    check that every refund is written exactly once.
+    """
+    with odoo.api.Environment.manage():
+        with registry.cursor() as cr:
+            env = odoo.api.Environment(cr, odoo.SUPERUSER_ID, {})
+            refunds = _create_invoices(env, "out_refund", size, "finnish_rf")
+            refunds.post()
+            refund_ids = refunds.ids
+            cr.commit()
+
+        results = {}
+        for workers in workers_list:
+            with registry.cursor() as cr:
+                cr.execute(
+                    "UPDATE account_move SET invoice_payment_ref = NULL "
+                    "WHERE id IN %s", (tuple(refund_ids),)
+                )
+            stats = {"retries": 0, "written": 0}
+            lock = threading.Lock()
+            threads = [
+                threading.Thread(
+                    target=_stress_worker,
+                    args=(registry, refund_ids, chunk_size, stats, lock),
+                )
+                for dummy in range(workers)
+            ]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            seconds = time.perf_counter() - start
+
+            with registry.cursor() as cr:
+                cr.execute(
+                    "SELECT count(*) FROM account_move WHERE id IN %s "
+                    "AND COALESCE(invoice_payment_ref, '') = ''",
+                    (tuple(refund_ids),),
+                )
+                missing = cr.fetchone()[0]
+            results["stress.workers_%02d" % workers] = {
+                "seconds": round(seconds, 6),
+                "refunds_per_second": round(size / seconds, 1),
+                "retries": stats["retries"],
+                "written": stats["written"],
+                "missing": missing,
+                "size": size,
+            }
+            _logger.info(
+                "%d workers: %.0f refunds/s, %d retries, %d written, "
+                "%d missing", workers, size / seconds, stats["retries"],
+                stats["written"], missing,
+            )
+
+        with registry.cursor() as cr:
+            env = odoo.api.Environment(cr, odoo.SUPERUSER_ID, {})
+            refunds = env["account.move"].browse(refund_ids)
+            refunds.button_draft()
+            refunds.with_context(force_delete=True).unlink()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """ Return a list of regression descriptions """
+    regressions = []
+    for key, base in baseline.items():
+        result = results.get(key)
+        if not result or result["size"] != base["size"]:
+            continue
+        if result["seconds"] > base["seconds"] * (1 + tolerance):
+            regressions.append("%s: %.3fs, baseline %.3fs" % (
+                key, result["seconds"], base["seconds"]))
+        if result["queries"] > base["queries"]:
+            regressions.append("%s: %d queries, baseline %d" % (
+                key, result["queries"], base["queries"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-c", "--config", help="Odoo configuration file")
+    parser.add_argument("-d", "--database", required=True)
+    parser.add_argument("-n", "--size", type=int, default=1000,
+                        help="number of records per benchmark")
+    parser.add_argument("-b", "--benchmark", action="append",
+                        help="run only the named benchmark(s)")
+    parser.add_argument("-o", "--output", default="benchmark.json")
+    parser.add_argument("--baseline", help="JSON file of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative slowdown, default 0.2")
+    parser.add_argument("--stress", action="store_true",
+                        help="run the parallel refund reference stress test")
+    args = parser.parse_args()
+
+    odoo.tools.config.parse_config(
+        ["-c", args.config] if args.config else []
+    )
+    registry = odoo.registry(args.database)
+    if args.stress:
+        results = stress_refund_references(
+            registry, args.size, (1, 2, 4, 8, 16)
+        )
+        with open(args.output, "w") as output:
+            json.dump({"results": results}, output, indent=2, sort_keys=True)
+        return 1 if any(
+            result["missing"] or result["written"] != result["size"]
+            for result in results.values()
+        ) else 0
+
+    with odoo.api.Environment.manage(), registry.cursor() as cr:
+        env = odoo.api.Environment(cr, odoo.SUPERUSER_ID, {})
+        try:
+            results = run_benchmarks(env, args.size, args.benchmark)
+        finally:
+            cr.rollback()
+
+    with open(args.output, "w") as output:
+        json.dump({"results": results}, output, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(
+                results, json.load(baseline)["results"], args.tolerance
+            )
+        for regression in regressions:
+            _logger.error("Regression in %s", regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
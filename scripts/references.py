@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Compute or validate Finnish and RF payment references in bulk.
+
+Reads one base number or reference per line from the given files or stdin
+and spreads the work over a process pool in chunks. Does not need Odoo, only
+the reference functions of l10n_fi_payment_reference:
+
+    python scripts/references.py compute --rf numbers.txt > references.tsv
+    python scripts/references.py validate < references.txt
+
+`compute` writes `base number<TAB>reference` lines in the input order.
+`validate` writes the invalid references. A summary goes to stderr, and the
+exit status is 1 if any number or reference was rejected.
+"""
+import argparse
+import fileinput
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "l10n_fi_payment_reference",
+))
+
+import payment_reference  # noqa: E402
+
+
+def _compute_chunk(args):
+    numbers, rf = args
+    compute = (
+        payment_reference.compute_payment_reference_finnish_rf if rf
+        else payment_reference.compute_payment_reference_finnish
+    )
+    results = []
+    for number in numbers:
+        try:
+            results.append((number, compute(number)))
+        except payment_reference.PaymentReferenceError:
+            results.append((number, None))
+    return results
+
+
+def _validate_chunk(args):
+    references, dummy = args
+    return [
+        (reference, payment_reference.validate_payment_reference(reference))
+        for reference in references
+    ]
+
+
+def _iter_chunks(lines, chunk_size, rf):
+    lines = (line.strip() for line in lines)
+    lines = (line for line in lines if line)
+    while True:
+        chunk = list(itertools.islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield chunk, rf
+
+
+def main():
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument("files", nargs="*",
+                         help="input files, stdin when none are given")
+    options.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                         help="number of processes, default one per core")
+    options.add_argument("--chunk-size", type=int, default=10000,
+                         help="lines per task, default 10000")
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    # A sub-command each, so that the files may follow the options
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+    compute = commands.add_parser("compute", parents=[options],
+                                  help="compute references of base numbers")
+    compute.add_argument("--rf", action="store_true",
+                         help="compute RF creditor references")
+    commands.add_parser("validate", parents=[options],
+                        help="list the invalid references")
+    args = parser.parse_args()
+
+    worker = _compute_chunk if args.command == "compute" else _validate_chunk
+    chunks = _iter_chunks(fileinput.input(args.files), args.chunk_size,
+                          getattr(args, "rf", False))
+    # Payment references are short, compute them in this process
+    # unless there are several cores to spread them over
+    pool = multiprocessing.Pool(args.jobs) if args.jobs > 1 else None
+    results = pool.imap(worker, chunks) if pool else map(worker, chunks)
+
+    start = time.perf_counter()
+    total = rejected = 0
+    write = sys.stdout.write
+    try:
+        for chunk in results:
+            total += len(chunk)
+            for value, result in chunk:
+                if args.command == "compute":
+                    if result is None:
+                        rejected += 1
+                        write("%s\t\n" % value)
+                    else:
+                        write("%s\t%s\n" % (value, result))
+                elif not result:
+                    rejected += 1
+                    write("%s\n" % value)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    seconds = time.perf_counter() - start
+
+    sys.stderr.write(
+        "%s: %d lines, %d rejected in %.2fs (%.0f lines/s, %d processes)\n"
+        % (args.command, total, rejected, seconds,
+           total / seconds if seconds else 0, max(args.jobs, 1))
+    )
+    return 1 if rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
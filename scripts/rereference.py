@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Recompute the payment references of the open invoices of journals.
+
+Use after changing the reference model of a journal, e.g. from `odoo` to
+`finnish_rf`. The moves are processed in chunks of ids with a commit after
+every chunk, so the run can be interrupted at any point and continues after
+the last committed chunk when started again:
+
+    python scripts/rereference.py -c odoo.conf -d db --journal 1 --dry-run
+
+With --dry-run nothing is written and the changes are printed as
+`move name<TAB>old reference<TAB>new reference` lines as they are found.
+"""
+import argparse
+import logging
+import sys
+
+import odoo
+
+_logger = logging.getLogger("l10n_fi_rereference")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-c", "--config", help="Odoo configuration file")
+    parser.add_argument("-d", "--database", required=True)
+    parser.add_argument("-j", "--journal", type=int, action="append",
+                        required=True, help="journal id, can be repeated")
+    parser.add_argument("--chunk-size", type=int, default=1000,
+                        help="moves per chunk and commit, default 1000")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print the changes without writing them")
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore the progress of an interrupted run")
+    args = parser.parse_args()
+
+    odoo.tools.config.parse_config(
+        ["-c", args.config] if args.config else []
+    )
+    registry = odoo.registry(args.database)
+    with odoo.api.Environment.manage(), registry.cursor() as cr:
+        env = odoo.api.Environment(cr, odoo.SUPERUSER_ID, {})
+        journals = env["account.journal"].browse(args.journal).exists()
+        if len(journals) != len(set(args.journal)):
+            _logger.error("Unknown journal ids: %s",
+                          set(args.journal) - set(journals.ids))
+            return 1
+        changes = journals._rereference_open_moves(
+            chunk_size=args.chunk_size,
+            dry_run=args.dry_run,
+            commit=not args.dry_run,
+            resume=not args.restart,
+        )
+        for name, old, new in changes:
+            if args.dry_run:
+                sys.stdout.write("%s\t%s\t%s\n" % (name, old or "", new))
+        if args.dry_run:
+            cr.rollback()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())